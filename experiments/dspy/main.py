@@ -1,4 +1,4 @@
-import dspy, json, random
+import dspy, json, random, os
 
 from metric import metric
 
@@ -26,7 +26,11 @@ class JavaToKotlin(dspy.Signature):
   kotlin_code: str = dspy.OutputField(desc="Only valid Kotlin, starting after <<START_J2K>>")
 
 converter = dspy.ChainOfThought(JavaToKotlin)
-dspy.configure(lm=dspy.LM("ollama_chat/codellama:instruct", api_base="http://localhost:11434", api_key=""))
+# OLLAMA_HOST is usually host:port with no scheme, as ollama itself takes it
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+if "://" not in OLLAMA_HOST:
+  OLLAMA_HOST = f"http://{OLLAMA_HOST}"
+dspy.configure(lm=dspy.LM("ollama_chat/codellama:instruct", api_base=OLLAMA_HOST.rstrip("/"), api_key=""))
 
 # extract data
 
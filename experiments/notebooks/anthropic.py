@@ -6,6 +6,9 @@ import re
 from typing import Any, Dict, Iterable, List, Optional
 from types import SimpleNamespace as _NS
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
 
 __all__ = ["Anthropic"]
 
@@ -75,9 +78,32 @@ class _MessageResponse:
 
 # ------------------------------ Client ---------------------------------
 
+class _Retry(Retry):
+    """Retry that treats only read timeouts as read errors, so reset connections are still retried."""
+    def _is_read_error(self, err: Exception) -> bool:
+        return isinstance(err, ReadTimeoutError)
+
+def _pooled_session(pool_size: int = 8, retries: int = 3, backoff: float = 0.5) -> requests.Session:
+    """Keep-alive session that retries 5xx responses and reset or failed connections with backoff, but never read timeouts."""
+    retry = _Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=None,  # /api/chat is a POST, which urllib3 won't retry by default
+        read=0,  # a timed out generation would be re-run from scratch, multiplying the timeout
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 class _Messages:
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, session: requests.Session, timeout: Any):
         self.base_url = base_url.rstrip("/")
+        self.session = session
+        self.timeout = timeout
 
     def create(
         self,
@@ -138,7 +164,7 @@ class _Messages:
         }
 
         url = f"{self.base_url}/api/chat"
-        resp = requests.post(url, json=payload, timeout=600)
+        resp = self.session.post(url, json=payload, timeout=self.timeout, stream=bool(stream))
         resp.raise_for_status()
 
         if not stream:
@@ -165,6 +191,9 @@ class Anthropic:
         self,
         api_key: Optional[str] = None,
         base_url: Optional[str] = None,
+        pool_size: int = 8,
+        max_retries: int = 3,
+        timeout: Any = (5, 600),
     ):
         # Default to common Ollama envs, then localhost.
         base = (
@@ -175,4 +204,5 @@ class Anthropic:
             or "http://localhost:11434"
         )
         self.api_key = api_key  # not used by Ollama
-        self.messages = _Messages(base)
\ No newline at end of file
+        # one pooled connection per client, reused by every call
+        self.messages = _Messages(base, _pooled_session(pool_size, max_retries), timeout)
\ No newline at end of file
@@ -387,9 +387,6 @@ if TASK_DESCRIPTION:
 if EXAMPLES:
   PROMPT += f"""\n\n{EXAMPLES}"""
 
-if INPUT_DATA:
-  PROMPT += f"""\n\n{INPUT_DATA}"""
-
 if INVARIANTS:
   PROMPT += f"""\n\n{INVARIANTS}"""
 
@@ -402,10 +399,19 @@ if OUTPUT_FORMATTING:
 if REMARKS:
   PROMPT += f"""\n\n{REMARKS}"""
 
+# the java input goes last, so everything before it is identical between files and stays in ollama's prompt cache
+if INPUT_DATA:
+  PROMPT += f"""\n\n{INPUT_DATA}"""
+
 import requests
 import json
+import os
 
-OLLAMA_URL = "http://localhost:11434/api/chat"
+# OLLAMA_HOST is usually host:port with no scheme, as ollama itself takes it
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+if "://" not in OLLAMA_HOST:
+  OLLAMA_HOST = f"http://{OLLAMA_HOST}"
+OLLAMA_URL = OLLAMA_HOST.rstrip("/") + "/api/chat"
 MODEL = "deepseek-r1:8b"
 
 messages = [
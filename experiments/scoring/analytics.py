@@ -6,6 +6,8 @@ from pygments import lex
 
 from pathlib import Path
 
+from results_store import ResultsStore
+
 IMPORTS_PACKAGE_VALID = False
 
 def strip_kotlin_comments(source: str) -> str:
@@ -34,54 +36,94 @@ def parse_test_results(report_text):
 
   return results
 
-print("==========" * 2)
-for score_path in sorted(glob.glob("v[0-9]*/scores.txt")):
-  results = parse_test_results(open(score_path, "r").read())
-  num_cases = len(results)
-  # how many compiled
+def kotlin_log(log_path, file) -> Path:
+  """
+  the converted kotlin of `file` under `log_path`; older runs wrote logs by file name, not by relative path
+  """
+  kotlin_file = (log_path / file).with_suffix(".kt")
+  return kotlin_file if kotlin_file.exists() else (log_path / Path(file).name).with_suffix(".kt")
+
+def load_results(version_dir, model=None):
+  """
+  return the results of a version, from its results store if it has one and from `scores.txt` otherwise.
+
+  a store copied from the project holds every version and model scored there, so only this version's rows
+  are read, for `model` or, by default, for the model the version was last scored with
+  """
+  store_path = Path(version_dir) / "results.sqlite"
+  if store_path.exists():
+    version = Path(version_dir).name
+    rows = ResultsStore(store_path).rows(version=version)
+    models = {row["model"] for row in rows}
+    if model is None and len(models) > 1:
+      model = rows[-1]["model"]
+      print(f"{version}: results for {len(models)} models in the store, using {model}")
+
+    return [{
+      "file": row["path"],
+      "score": row["score"],
+      "tests_run": row["runnable"],
+      "tests_passed": row["passed"],
+    } for row in rows if model is None or row["model"] == model]
+
+  score_path = Path(version_dir) / "scores.txt"
+  if score_path.exists():
+    return parse_test_results(score_path.read_text())
+
+  return None
+
+if __name__ == "__main__":
+  print("==========" * 2)
+  for version_dir in sorted(glob.glob("v[0-9]*/")):
+    results = load_results(version_dir)
+    if results is None:
+      continue
+
+    num_cases = len(results)
+    # how many compiled
 
-  compiled_tests = list(filter(lambda x: x["tests_run"] != 0, results))
-  num_compiled = len(compiled_tests)
+    compiled_tests = list(filter(lambda x: x["tests_run"] != 0, results))
+    num_compiled = len(compiled_tests)
 
-  # average score among those that compiled
+    # average score among those that compiled
 
-  total_score_compiled = sum([x["score"] for x in compiled_tests])
+    total_score_compiled = sum([x["score"] for x in compiled_tests])
 
-  # how many passed 100%
+    # how many passed 100%
 
-  num_hundred_percent = len(list(filter(lambda x: x["tests_run"] == x["tests_passed"], compiled_tests)))
+    num_hundred_percent = len(list(filter(lambda x: x["tests_run"] == x["tests_passed"], compiled_tests)))
 
-  print(f"""{num_cases} files were analysed
+    print(f"""{num_cases} files were analysed
 {num_compiled} compiled and ran some tests
 {total_score_compiled/num_compiled} was the average score of the ones that compiled
 {num_hundred_percent} files achieved 100% on tests""")
   
-  # compute single score
+    # compute single score
 
-  log_path = Path(score_path).parent / "logs"
-  total_scores = []
-  total_lines = 0
-  for result in results:
-    kotlin_file = (log_path / result["file"]).with_suffix(".kt")
+    log_path = Path(version_dir) / "logs"
+    total_scores = []
+    total_lines = 0
+    for result in results:
+      kotlin_file = kotlin_log(log_path, result["file"])
 
-    real_lines = [line for line in strip_kotlin_comments(kotlin_file.read_text()).splitlines() if line.strip() != ""]
+      real_lines = [line for line in strip_kotlin_comments(kotlin_file.read_text()).splitlines() if line.strip() != ""]
 
-    if not IMPORTS_PACKAGE_VALID:
-      real_lines = [line for line in real_lines if not line.lower().startswith("import ") and not line.lower().startswith("package ")]
+      if not IMPORTS_PACKAGE_VALID:
+        real_lines = [line for line in real_lines if not line.lower().startswith("import ") and not line.lower().startswith("package ")]
 
-    num_lines = len(real_lines)
+      num_lines = len(real_lines)
     
-    if num_lines == 0:
-      # empty code means no code to evaluate, so shouldn't touch score
-      continue
-    else:
-      total_lines += num_lines
-      score_for_file = (0 if result["tests_run"] == 0 else (result["tests_passed"] / result["tests_run"])) * num_lines
-
-    total_scores.append(score_for_file)
+      if num_lines == 0:
+        # empty code means no code to evaluate, so shouldn't touch score
+        continue
+      else:
+        total_lines += num_lines
+        score_for_file = (0 if result["tests_run"] == 0 else (result["tests_passed"] / result["tests_run"])) * num_lines
+
+      total_scores.append(score_for_file)
   
-  version = Path(score_path).parent.name
+    version = Path(version_dir).name
   
-  print(f"raw score for {version}: {sum(total_scores)}")
-  print(f"score for {version}: {sum(total_scores) / total_lines}")
-  print("==========" * 2)
\ No newline at end of file
+    print(f"raw score for {version}: {sum(total_scores)}")
+    print(f"score for {version}: {sum(total_scores) / total_lines}")
+    print("==========" * 2)
\ No newline at end of file
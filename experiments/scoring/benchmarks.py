@@ -0,0 +1,184 @@
+"""
+micro-benchmarks for the harness's pure-python hot paths.
+
+  python benchmarks.py [--quick] [--output benchmark_results.jsonl]
+
+each benchmark runs against the real petclinic conversions in `v*/logs` and against synthetic inputs of
+5k, 20k and 50k lines. results are appended to the output file as one json line per run, tagged with the
+current commit, and compared against the previous run so regressions show up across commits.
+"""
+import argparse, glob, importlib.util, json, pathlib, platform, statistics, subprocess, sys, tempfile, time, timeit
+
+import analytics
+import scoring
+import v1_conversion
+import v3_conversion
+
+HERE = pathlib.Path(__file__).resolve().parent
+SIZES = [5_000, 20_000, 50_000]
+
+def _real_files(suffix) -> list[str]:
+  return [pathlib.Path(p).read_text() for p in sorted(glob.glob(str(HERE / "v*" / "logs" / "**" / f"*{suffix}"), recursive=True))]
+
+def _repeat_to(texts, lines) -> str:
+  """
+  concatenate `texts` over and over until the result has at least `lines` lines
+  """
+  out, count = [], 0
+  while count < lines:
+    for text in texts:
+      out.append(text)
+      count += text.count("\n") + 1
+      if count >= lines:
+        break
+  return "\n".join(out)
+
+def _synthetic_java(lines) -> str:
+  """
+  a single class of roughly `lines` lines of fields, accessors and small methods
+  """
+  out = ["package org.example;", "", "import java.util.List;", "", "public class Synthetic {"]
+  i = 0
+  while len(out) < lines:
+    out += [
+      f"  private List<String> field{i};",
+      f"  public List<String> getField{i}() {{ return this.field{i}; }}",
+      f"  public void setField{i}(List<String> field{i}) {{ this.field{i} = field{i}; }}",
+      f"  public int compute{i}(int a, String... rest) {{",
+      "    // adds the rest count",
+      f"    return a + rest.length + {i};",
+      "  }",
+    ]
+    i += 1
+  out.append("}")
+  return "\n".join(out)
+
+def _model_output(kotlin, steps=4) -> str:
+  """
+  a v2-shaped completion: reasoning and a full kotlin block after each step
+  """
+  return "\n".join(f"{step}: reasoning about the conversion.\n<kotlin>\n{kotlin}\n</kotlin>\nInvariants check after Step {step}" for step in range(1, steps + 1))
+
+def _junit_reports(directory, tests) -> list[pathlib.Path]:
+  paths = []
+  for suite in range(max(1, tests // 50)):
+    path = pathlib.Path(directory) / f"TEST-org.example.Suite{suite}.xml"
+    cases = "".join(f'<testcase name="test{case}" classname="org.example.Suite{suite}" time="0.001"/>' for case in range(50))
+    path.write_text(f'<?xml version="1.0" encoding="UTF-8"?><testsuite name="org.example.Suite{suite}" tests="50" skipped="1" failures="2" errors="0">{cases}</testsuite>')
+    paths.append(path)
+  return paths
+
+def _load_metric():
+  """
+  import `../dspy/metric.py`, which needs `tree_sitter_language_pack`; None when it isn't installed
+  """
+  path = HERE.parent / "dspy" / "metric.py"
+  spec = importlib.util.spec_from_file_location("metric", path)
+  module = importlib.util.module_from_spec(spec)
+  try:
+    spec.loader.exec_module(module)
+  except ImportError:
+    return None
+  return module
+
+class _Example:
+  def __init__(self, java_code="", kotlin_code=""):
+    self.java_code = java_code
+    self.kotlin_code = kotlin_code
+
+def benchmarks(quick=False):
+  """
+  yield `(name, input description, callable)` for every benchmark
+  """
+  java_logs = _real_files(".java")
+  kotlin_logs = _real_files(".kt")
+  scores = [p.read_text() for p in sorted(HERE.glob("v*/scores.txt"))]
+  sizes = SIZES[:1] if quick else SIZES
+
+  java_inputs = [("petclinic", "\n".join(java_logs))] + [(f"{n} lines", _synthetic_java(n)) for n in sizes]
+  kotlin_inputs = [("petclinic", "\n".join(kotlin_logs))] + [(f"{n} lines", _repeat_to(kotlin_logs, n)) for n in sizes]
+
+  for label, java in java_inputs:
+    yield "list_function_addresses", label, lambda java=java: v3_conversion.list_function_addresses(java)
+
+  for label, kotlin in kotlin_inputs:
+    output = _model_output(kotlin)
+    yield "_get_last_kotlin_text", label, lambda output=output: v3_conversion._get_last_kotlin_text(output)
+    sentinel = f"thinking...\n<<START_J2K>>\n{kotlin}"
+    yield "_get_after_sentinel", label, lambda sentinel=sentinel: v1_conversion._get_after_sentinel(sentinel)
+    yield "strip_kotlin_comments", label, lambda kotlin=kotlin: analytics.strip_kotlin_comments(kotlin)
+
+  report = "\n".join(scores)
+  yield "parse_test_results", "petclinic", lambda: analytics.parse_test_results(report)
+  for n in sizes:
+    synthetic = _repeat_to(scores, n)
+    yield "parse_test_results", f"{n} lines", lambda synthetic=synthetic: analytics.parse_test_results(synthetic)
+
+  # each benchmark is measured as soon as it is yielded, so the reports are only needed inside this block
+  with tempfile.TemporaryDirectory(prefix="j2k-junit-") as reports:
+    for tests in ([54] if quick else [54, 5_000, 50_000]):
+      paths = _junit_reports(reports, tests)
+      yield "parse_junit_reports", f"{tests} tests", lambda paths=paths: scoring.parse_junit_reports(paths)
+
+  metric = _load_metric()
+  if metric is None:
+    print("skipping dspy/metric.py checks: tree_sitter_language_pack is not installed", file=sys.stderr)
+    return
+
+  for (label, java), (_, kotlin) in zip(java_inputs, kotlin_inputs):
+    gold = _Example(java_code=java)
+    pred = _Example(kotlin_code=f"<<START_J2K>>\n{kotlin}")
+    yield "metric.valid_kotlin_syntax", label, lambda pred=pred: metric.valid_kotlin_syntax(pred.kotlin_code)
+    yield "metric.no_lost_imports", label, lambda gold=gold, pred=pred: metric.no_lost_imports(gold, pred)
+    yield "metric.open_classes_match", label, lambda gold=gold, pred=pred: metric.open_classes_match(gold, pred)
+    yield "metric.mutability_match", label, lambda gold=gold, pred=pred: metric.mutability_match(gold, pred)
+
+def measure(function, repeat=3) -> dict:
+  timer = timeit.Timer(function)
+  number, _ = timer.autorange()
+  runs = [seconds / number for seconds in timer.repeat(repeat=repeat, number=number)]
+  return {"min": min(runs), "median": statistics.median(runs)}
+
+def _commit() -> str:
+  try:
+    return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, check=True, capture_output=True, text=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return "unknown"
+
+def _previous(output) -> dict:
+  path = pathlib.Path(output)
+  if not path.exists():
+    return {}
+  lines = [line for line in path.read_text().splitlines() if line.strip()]
+  return json.loads(lines[-1])["results"] if lines else {}
+
+def main():
+  parser = argparse.ArgumentParser(description="micro-benchmarks for the scoring harness")
+  parser.add_argument("--quick", action="store_true", help="only the petclinic logs and the smallest synthetic size")
+  parser.add_argument("--output", default=str(HERE / "benchmark_results.jsonl"))
+  args = parser.parse_args()
+
+  previous = _previous(args.output)
+  results = {}
+
+  print(f"{'benchmark':<28} {'input':<14} {'median':>12} {'vs last':>8}")
+  for name, label, function in benchmarks(quick=args.quick):
+    key = f"{name} [{label}]"
+    results[key] = measure(function)
+
+    change = ""
+    if key in previous:
+      change = f"{(results[key]['median'] / previous[key]['median'] - 1) * 100:+.0f}%"
+    print(f"{name:<28} {label:<14} {results[key]['median'] * 1000:>10.3f}ms {change:>8}")
+
+  with open(args.output, "a") as f:
+    f.write(json.dumps({
+      "commit": _commit(),
+      "time": time.time(),
+      "python": platform.python_version(),
+      "machine": platform.machine(),
+      "results": results,
+    }) + "\n")
+
+if __name__ == "__main__":
+  main()
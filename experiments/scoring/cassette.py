@@ -0,0 +1,46 @@
+import gzip, json, pathlib, threading
+
+class Cassette:
+  """
+  gzip-compressed jsonl recording of model requests and their raw response bodies.
+
+  in "record" mode every response is appended as its own gzip member, in a single write, so several
+  processes can record into one cassette. in "replay" mode responses are served from the recording,
+  byte for byte, and a request that was never recorded is an error rather than a silent model call.
+  identical requests recorded several times are replayed in the order they were recorded
+  """
+  def __init__(self, path, mode="replay"):
+    if mode not in ("record", "replay"):
+      raise ValueError(f"unknown cassette mode {mode!r}")
+
+    self.path = pathlib.Path(path)
+    self.mode = mode
+    self.lock = threading.Lock()
+    self.tapes = {}
+    self.positions = {}
+
+    if mode == "replay":
+      with gzip.open(self.path, "rt", encoding="utf-8") as f:
+        for line in f:
+          if line.strip():
+            entry = json.loads(line)
+            self.tapes.setdefault(entry["key"], []).append(entry["body"])
+
+  def record(self, key, payload, body):
+    line = json.dumps({"key": key, "request": payload, "body": body}, ensure_ascii=False) + "\n"
+    member = gzip.compress(line.encode("utf-8"))
+
+    with self.lock, open(self.path, "ab") as f:
+      f.write(member)
+
+  def replay(self, key) -> str:
+    if key not in self.tapes:
+      raise KeyError(f"request {key[:12]} is not in cassette {self.path}")
+
+    with self.lock:
+      bodies = self.tapes[key]
+      position = self.positions.get(key, 0)
+      self.positions[key] = position + 1
+
+    # once a request's recordings are used up, its last response keeps being replayed
+    return bodies[min(position, len(bodies) - 1)]
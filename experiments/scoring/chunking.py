@@ -0,0 +1,152 @@
+"""
+conversion of large java files in pieces: the compilation unit is split into its type declarations, each
+piece is converted on its own (concurrently), and the kotlin is stitched back into one file under a single
+package and import header.
+
+a type larger than the chunk size has its nested types cut out into chunks of their own, leaving a marker
+comment where each one was; a type with no nested types to cut out stays one chunk however large it is.
+"""
+import asyncio, re, textwrap
+from tree_sitter_languages import get_parser
+
+import ollama_client
+
+PARSER = get_parser("java")
+TYPE_NODES = {"class_declaration", "interface_declaration", "enum_declaration", "record_declaration", "annotation_type_declaration"}
+COMMENTS = {"line_comment", "block_comment"}
+
+MARKER = "// @j2k-chunk {}"
+MARKER_RE = re.compile(r"^([ \t]*)//\s*@j2k-chunk\s+(\d+)[ \t]*$", re.MULTILINE)
+HEADER_RE = re.compile(r"^(?:package|import)\s.*$\n?", re.MULTILINE)
+
+def _txt(src: bytes, start, end) -> str:
+  return src[start:end].decode("utf-8", errors="ignore")
+
+def line_count(text) -> int:
+  return text.count("\n") + 1
+
+def _is_inner(node) -> bool:
+  """
+  whether a nested type is a java inner class, which holds a reference to its outer instance
+  """
+  modifiers = next((c for c in node.children if c.type == "modifiers"), None)
+  static = modifiers is not None and any(c.type == "static" for c in modifiers.children)
+  enclosing = node.parent.parent
+  return node.type == "class_declaration" and not static and enclosing.type in ("class_declaration", "enum_declaration")
+
+def split(java_src: str, max_lines: int):
+  """
+  return the file's leading comment (such as a license), its package and import header, and its chunks:
+  dicts of the java of one type (with markers in place of the nested types cut out of it, and starting at
+  its javadoc), its child chunk indices, and whether it is an inner class. the top level types are the
+  chunks with `top` set, in file order
+  """
+  src = java_src.encode("utf-8", errors="ignore")
+  root = PARSER.parse(src).root_node
+
+  declarations = [n for n in root.named_children if n.type in ("package_declaration", "import_declaration")]
+  header = _txt(src, declarations[0].start_byte, declarations[-1].end_byte) if declarations else ""
+
+  # comments before the package belong to the file; without a package or imports, they document the first type
+  file_comments = []
+  if declarations:
+    file_comments = [n for n in root.named_children if n.type in COMMENTS and n.end_byte <= declarations[0].start_byte]
+  leading = _txt(src, file_comments[0].start_byte, file_comments[-1].end_byte) if file_comments else ""
+  chunks = []
+
+  def add(node, top, first=None):
+    index = len(chunks)
+    chunks.append(None)
+
+    body = node.child_by_field_name("body")
+    nested = [m for m in body.named_children if m.type in TYPE_NODES] if body else []
+    # from the start of the line, so a nested type dedents to the top level as a whole
+    first = first or node
+    line_start = src.rfind(b"\n", 0, first.start_byte) + 1
+    start = line_start if not src[line_start:first.start_byte].strip() else first.start_byte
+    text = _txt(src, start, node.end_byte)
+
+    children = []
+    if nested and line_count(text) > max_lines:
+      pieces, position = [], start
+      for member in nested:
+        child = add(member, top=False)
+        children.append(child)
+        pieces += [_txt(src, position, member.start_byte), MARKER.format(child)]
+        position = member.end_byte
+      text = "".join(pieces) + _txt(src, position, node.end_byte)
+
+    chunks[index] = {"java": textwrap.dedent(text), "children": children, "inner": not top and _is_inner(node), "top": top}
+    return index
+
+  for n in root.named_children:
+    if n.type in TYPE_NODES:
+      # the type's chunk starts at the comments right before it, which are its javadoc
+      first = n
+      while first.prev_named_sibling is not None and first.prev_named_sibling.type in COMMENTS \
+          and first.prev_named_sibling not in file_comments:
+        first = first.prev_named_sibling
+      add(n, top=True, first=first)
+
+  return leading, header, chunks
+
+def _body(kotlin) -> str:
+  return HEADER_RE.sub("", kotlin).strip("\n")
+
+def _indent(text, indent) -> str:
+  return "\n".join(indent + line if line.strip() else line for line in text.splitlines())
+
+def stitch(chunks, converted, leading="") -> str:
+  """
+  join the kotlin of every chunk (`converted`, by chunk index) into one file, under the java file's
+  `leading` comment
+  """
+  package, imports = None, []
+  for kotlin in converted:
+    for line in kotlin.splitlines():
+      if line.startswith("package ") and package is None:
+        package = line.strip()
+      elif line.startswith("import ") and line.strip() not in imports:
+        imports.append(line.strip())
+
+  def assemble(index):
+    kotlin = _body(converted[index])
+    if chunks[index]["inner"]:
+      # converted on its own, a java inner class comes back as a plain nested one
+      kotlin = re.sub(r"(?<![\w.])class\s", "inner class ", kotlin, count=1)
+
+    for child in chunks[index]["children"]:
+      marker = next((m for m in MARKER_RE.finditer(kotlin) if int(m.group(2)) == child), None)
+      if marker:
+        kotlin = kotlin[:marker.start()] + _indent(assemble(child), marker.group(1)) + kotlin[marker.end():]
+      else:
+        # the model dropped the marker comment, so the nested type goes at the end of the class body
+        end = kotlin.rfind("}")
+        kotlin = kotlin[:end].rstrip("\n") + "\n\n" + _indent(assemble(child), "    ") + "\n" + kotlin[end:]
+    return kotlin
+
+  parts = [leading, package, "\n".join(imports)]
+  parts += [assemble(index) for index, chunk in enumerate(chunks) if chunk["top"]]
+  return "\n\n".join(part for part in parts if part) + "\n"
+
+async def _convert_chunks(header, chunks, convert, concurrency):
+  semaphore = asyncio.Semaphore(concurrency)
+
+  async def convert_one(chunk):
+    async with semaphore:
+      # each chunk is a compilable unit of its own, with the file's package and imports
+      return await asyncio.to_thread(convert, f"{header}\n\n{chunk['java']}" if header else chunk["java"])
+
+  return await asyncio.gather(*(convert_one(chunk) for chunk in chunks))
+
+def convert_in_chunks(java_src: str, convert, max_lines: int, concurrency=4) -> str:
+  """
+  convert `java_src` with `convert` one type declaration at a time, at most `concurrency` at once
+  """
+  leading, header, chunks = split(java_src, max_lines)
+  if len(chunks) <= 1:
+    return convert(java_src)
+
+  ollama_client.count("chunks", len(chunks))
+  converted = asyncio.run(_convert_chunks(header, chunks, convert, concurrency))
+  return stitch(chunks, converted, leading)
@@ -0,0 +1,68 @@
+import hashlib, json, sqlite3, time
+from contextlib import contextmanager
+
+def cache_key(*parts) -> str:
+  """
+  return a stable content hash of json-serialisable `parts`
+  """
+  canonical = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+  return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class ConversionCache:
+  """
+  persistent key -> text store in a single sqlite file, evicting least recently used entries once the
+  stored values exceed `max_bytes`.
+
+  a connection is opened per operation, so one cache file can be shared by threads and pool processes
+  """
+  def __init__(self, path, max_bytes=512 * 1024 * 1024):
+    self.path = str(path)
+    self.max_bytes = max_bytes
+
+    with self._connect() as db:
+      db.execute("PRAGMA journal_mode=WAL")
+      db.execute("""CREATE TABLE IF NOT EXISTS entries (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        last_used REAL NOT NULL
+      )""")
+      db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+
+  @contextmanager
+  def _connect(self):
+    db = sqlite3.connect(self.path, timeout=30)
+    try:
+      with db:
+        yield db
+    finally:
+      db.close()
+
+  def get(self, key):
+    with self._connect() as db:
+      row = db.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+      if row is None:
+        return None
+      db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+      return row[0]
+
+  def put(self, key, value):
+    size = len(value.encode("utf-8"))
+
+    with self._connect() as db:
+      db.execute(
+        "INSERT OR REPLACE INTO entries (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+        (key, value, size, time.time())
+      )
+      self._evict(db)
+
+  def _evict(self, db):
+    total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+    if total <= self.max_bytes:
+      return
+
+    for key, size in db.execute("SELECT key, size FROM entries ORDER BY last_used ASC").fetchall():
+      db.execute("DELETE FROM entries WHERE key = ?", (key,))
+      total -= size
+      if total <= self.max_bytes:
+        break
@@ -0,0 +1,98 @@
+import json, pathlib, tempfile
+import xml.etree.ElementTree as ET
+
+from gradle import Gradle
+
+INDEX_PATH = "coverage_index.json"
+
+INIT_SCRIPT = """allprojects {
+  apply plugin: 'jacoco'
+
+  tasks.withType(JacocoReport).configureEach {
+    reports {
+      xml.required = true
+    }
+  }
+}
+"""
+
+def source_key(relative_path) -> str:
+  """
+  return the source root relative key of a java file (`org/example/Owner.java`), as jacoco reports it
+  """
+  parts = pathlib.Path(relative_path).parts
+  if "java" in parts[:-1]:
+    parts = parts[parts.index("java") + 1:]
+  return "/".join(parts)
+
+def _test_classes(project) -> list[str]:
+  classes = set()
+  for xml_path in pathlib.Path(project).glob("**/build/test-results/test/*.xml"):
+    try:
+      suite = ET.parse(xml_path).getroot()
+    except ET.ParseError:
+      continue
+    name = suite.attrib.get("name")
+    if name:
+      # nested test classes are selected through their outer class
+      classes.add(name.split("$")[0])
+  return sorted(classes)
+
+def _reports(project) -> list[pathlib.Path]:
+  return list(pathlib.Path(project).glob("**/build/reports/jacoco/test/jacocoTestReport.xml"))
+
+def _covered_sources(project) -> set[str]:
+  covered = set()
+  for report in _reports(project):
+    root = ET.parse(report).getroot()
+    for package in root.iter("package"):
+      for source in package.findall("sourcefile"):
+        lines = [c for c in source.findall("counter") if c.attrib.get("type") == "LINE"]
+        if lines and int(lines[0].attrib.get("covered", "0")) > 0:
+          covered.add(f"{package.attrib['name']}/{source.attrib['name']}")
+  return covered
+
+def build_index(gradle: Gradle, path=INDEX_PATH) -> dict[str, list[str]]:
+  """
+  run each test class of the unconverted project on its own under jacoco, recording which main
+  source files it covers, and save the resulting source file -> test classes index to `path`
+  """
+  with tempfile.NamedTemporaryFile("w", suffix=".gradle", delete=False) as f:
+    f.write(INIT_SCRIPT)
+    init_script = f.name
+
+  try:
+    gradle.run("clean", "test", "--continue", "--init-script", init_script)
+
+    index: dict[str, list[str]] = {}
+    for test_class in _test_classes(gradle.project):
+      # a failed run leaves no report of its own, and the previous class's report must not be credited to it
+      for report in _reports(gradle.project):
+        report.unlink()
+
+      # cleanTest rather than --rerun-tasks, which would recompile the whole project for every class
+      process = gradle.run("cleanTest", "test", "--tests", test_class, "jacocoTestReport", "--init-script", init_script)
+      if process.returncode != 0:
+        print(f"skipping {test_class}: its coverage run failed")
+        continue
+
+      for source in _covered_sources(gradle.project):
+        index.setdefault(source, []).append(test_class)
+  finally:
+    pathlib.Path(init_script).unlink()
+
+  pathlib.Path(path).write_text(json.dumps(index, indent=2, sort_keys=True))
+  return index
+
+def load_index(path=INDEX_PATH) -> dict[str, list[str]]:
+  return json.loads(pathlib.Path(path).read_text())
+
+def tests_for(index, relative_path):
+  """
+  return the test classes covering the java file at `relative_path`, or None if it has no coverage data
+  """
+  return index.get(source_key(relative_path)) or None
+
+if __name__ == "__main__":
+  index = build_index(Gradle("."))
+  print(f"indexed {len(index)} source files")
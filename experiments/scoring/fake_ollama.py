@@ -0,0 +1,294 @@
+"""
+stand-in for the parts of the ollama api the harness uses, for benchmarking and testing without a model.
+
+  python fake_ollama.py --port 11435 --latency 0.5 --tps 40
+  OLLAMA_HOST=http://localhost:11435 python scoring.py
+
+`/api/chat` answers both streaming and non-streaming requests with ollama's response shape, including the
+timing fields. models are "loaded" on first use (costing `--load-latency`) and unloaded according to the
+request's `keep_alive`, as ollama does. `options.num_predict` caps the reply length. like ollama's prompt
+cache, the part of a prompt shared with the model's previous prompt is not evaluated again: only the rest
+counts towards `prompt_eval_count` and, with `--prompt-tps`, towards prompt processing time. with
+`--context-slowdown`, each generated token takes longer the more context precedes it, as attention does.
+
+replies are scripted with `--responses`, a jsonl file of `{"match": regex, "content": text}` objects: the
+first entry whose regex matches the last user message (and whose optional `model` regex matches the model)
+is used, and `{java}` in its content is replaced with the last java source in the prompt. without a
+script (or with no match), the java source is echoed back in `<kotlin>` tags.
+"""
+import argparse, json, os, random, re, threading, time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+JAVA = re.compile(r"<java>\n?(.*?)\n?</java>", re.DOTALL)
+TOKEN = re.compile(r"\s*\S+|\s+")
+
+def _duration(value, default=300.0):
+  """
+  parse an ollama keep_alive value ("5m", "30s", 0, -1) into seconds, where a negative value means forever
+  """
+  if value is None:
+    return default
+  if isinstance(value, (int, float)):
+    return float(value)
+
+  match = re.fullmatch(r"(-?\d+(?:\.\d+)?)(ms|s|m|h)?", str(value).strip())
+  if not match:
+    return default
+  scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[match.group(2) or "s"]
+  return float(match.group(1)) * scale
+
+class FakeOllama:
+  def __init__(self, latency=0.0, load_latency=0.0, tps=0.0, prompt_tps=0.0, responses=(), error_rate=0.0, parallel=1, seed=0, context_slowdown=0):
+    self.latency = latency
+    self.load_latency = load_latency
+    self.tps = tps
+    self.prompt_tps = prompt_tps
+    self.context_slowdown = context_slowdown
+    self.responses = list(responses)
+    self.error_rate = error_rate
+    self.slots = threading.BoundedSemaphore(parallel)
+    self.random = random.Random(seed)
+    self.lock = threading.Lock()
+    self.loaded = {} # model -> time it unloads (None for never)
+    self.prompts = {} # model -> last prompt, whose prefix is cached
+    self.requests = 0
+
+  def reply_for(self, messages, model="") -> str:
+    user = next((m.get("content", "") for m in reversed(messages) if m.get("role") in ("user", "human")), "")
+    # few-shot prompts carry example java too; the input to convert is the last block
+    blocks = JAVA.findall(user)
+    java = blocks[-1] if blocks else user
+
+    for response in self.responses:
+      if re.search(response.get("match", ""), user, re.DOTALL) and re.search(response.get("model", ""), model):
+        return response["content"].replace("{java}", java)
+
+    return f"<kotlin>\n{java}\n</kotlin>"
+
+  def load(self, model, keep_alive) -> float:
+    """
+    make sure `model` is resident, returning the seconds spent loading it
+    """
+    now = time.monotonic()
+    with self.lock:
+      until = self.loaded.get(model, 0)
+      resident = model in self.loaded and (until is None or until > now)
+
+    load_seconds = 0.0
+    if not resident:
+      time.sleep(self.load_latency)
+      load_seconds = self.load_latency
+      with self.lock:
+        self.prompts.pop(model, None)
+
+    seconds = _duration(keep_alive)
+    with self.lock:
+      if seconds == 0:
+        self.loaded.pop(model, None)
+        self.prompts.pop(model, None)
+      else:
+        self.loaded[model] = None if seconds < 0 else time.monotonic() + seconds
+
+    return load_seconds
+
+  def uncached(self, model, prompt) -> str:
+    """
+    return the part of `prompt` after the prefix it shares with the model's previous prompt, and cache it
+    """
+    with self.lock:
+      shared = len(os.path.commonprefix([self.prompts.get(model, ""), prompt]))
+      self.prompts[model] = prompt
+    return prompt[shared:]
+
+  def should_fail(self) -> bool:
+    with self.lock:
+      self.requests += 1
+      return self.random.random() < self.error_rate
+
+class Handler(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+  server_version = "FakeOllama/0.1"
+
+  def log_message(self, format, *args):
+    pass
+
+  def handle(self):
+    try:
+      super().handle()
+    except (BrokenPipeError, ConnectionResetError):
+      # the client dropped the connection, as a cancelled stream or a closed pooled socket does
+      pass
+
+  def _send_json(self, status, body):
+    data = json.dumps(body).encode("utf-8")
+    self.send_response(status)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(data)))
+    self.end_headers()
+    self.wfile.write(data)
+
+  def _send_chunk(self, body):
+    data = (json.dumps(body) + "\n").encode("utf-8")
+    self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+    self.wfile.flush()
+
+  def do_GET(self):
+    fake = self.server.fake
+    if self.path == "/api/tags" or self.path == "/api/ps":
+      with fake.lock:
+        models = list(fake.loaded)
+      self._send_json(200, {"models": [{"name": m, "model": m} for m in models]})
+    elif self.path == "/":
+      self._send_json(200, "Ollama is running")
+    else:
+      self._send_json(404, {"error": "not found"})
+
+  def do_POST(self):
+    if self.path != "/api/chat":
+      self._send_json(404, {"error": "not found"})
+      return
+
+    fake = self.server.fake
+    length = int(self.headers.get("Content-Length", "0"))
+    try:
+      request = json.loads(self.rfile.read(length) or b"{}")
+    except json.JSONDecodeError:
+      self._send_json(400, {"error": "invalid json"})
+      return
+
+    model = request.get("model", "")
+    messages = request.get("messages", [])
+    options = request.get("options") or {}
+    stream = request.get("stream", True)
+
+    if fake.should_fail():
+      self._send_json(500, {"error": "injected failure"})
+      return
+
+    # like ollama, requests beyond the parallel limit wait for a free slot
+    with fake.slots:
+      start = time.monotonic()
+      load_seconds = fake.load(model, request.get("keep_alive"))
+
+      # an empty message list only loads (or unloads) the model, as in ollama
+      if not messages:
+        self._send_json(200, {
+          "model": model,
+          "created_at": datetime.now(timezone.utc).isoformat(),
+          "message": {"role": "assistant", "content": ""},
+          "done_reason": "unload" if _duration(request.get("keep_alive")) == 0 else "load",
+          "done": True,
+        })
+        return
+
+      prompt = "".join(f"{m.get('role', '')}\n{m.get('content', '')}\n" for m in messages)
+      prompt_tokens = max(1, len(fake.uncached(model, prompt)) // 4)
+      context_tokens = len(prompt) // 4
+
+      tokens = TOKEN.findall(fake.reply_for(messages, model))
+      if "num_predict" in options and options["num_predict"] >= 0:
+        tokens = tokens[:options["num_predict"]]
+
+      time.sleep(fake.latency + (prompt_tokens / fake.prompt_tps if fake.prompt_tps > 0 else 0))
+      prompt_seconds = time.monotonic() - start - load_seconds
+
+      if stream:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+      eval_start = time.monotonic()
+      try:
+        for i, token in enumerate(tokens):
+          if fake.tps > 0:
+            # each multiple of `context_slowdown` tokens of context costs another token's worth of time
+            slowdown = 1 + (context_tokens + i) / fake.context_slowdown if fake.context_slowdown > 0 else 1
+            time.sleep(slowdown / fake.tps)
+          if stream:
+            self._send_chunk({
+              "model": model,
+              "created_at": datetime.now(timezone.utc).isoformat(),
+              "message": {"role": "assistant", "content": token},
+              "done": False,
+            })
+      except (BrokenPipeError, ConnectionResetError):
+        # the client stopped reading, which is how generation is cancelled
+        return
+      eval_seconds = time.monotonic() - eval_start
+
+      final = {
+        "model": model,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "message": {"role": "assistant", "content": "" if stream else "".join(tokens)},
+        "done_reason": "length" if len(tokens) == options.get("num_predict") else "stop",
+        "done": True,
+        "total_duration": int((time.monotonic() - start) * 1e9),
+        "load_duration": int(load_seconds * 1e9),
+        "prompt_eval_count": prompt_tokens,
+        "prompt_eval_duration": int(prompt_seconds * 1e9),
+        "eval_count": len(tokens),
+        "eval_duration": int(eval_seconds * 1e9),
+      }
+
+      if stream:
+        try:
+          self._send_chunk(final)
+          self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+          pass
+      else:
+        self._send_json(200, final)
+
+def serve(host="127.0.0.1", port=11434, **kwargs) -> ThreadingHTTPServer:
+  """
+  start a fake ollama server on a background thread and return it; call `.shutdown()` to stop it
+  """
+  server = ThreadingHTTPServer((host, port), Handler)
+  server.daemon_threads = True
+  server.fake = FakeOllama(**kwargs)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  return server
+
+def _load_responses(path):
+  if not path:
+    return []
+  with open(path, "r") as f:
+    return [json.loads(line) for line in f if line.strip()]
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="fake ollama server for offline harness benchmarking")
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=11434)
+  parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first token (prompt processing)")
+  parser.add_argument("--load-latency", type=float, default=0.0, help="seconds to load a model that is not resident")
+  parser.add_argument("--tps", type=float, default=0.0, help="generated tokens per second (0 is unlimited)")
+  parser.add_argument("--prompt-tps", type=float, default=0.0, help="uncached prompt tokens evaluated per second (0 is unlimited)")
+  parser.add_argument("--context-slowdown", type=int, default=0, help="tokens of context that double the time per generated token (0 is constant)")
+  parser.add_argument("--responses", help="jsonl file of {\"match\": regex, \"content\": text} replies")
+  parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+  parser.add_argument("--parallel", type=int, default=1, help="requests served at once, like OLLAMA_NUM_PARALLEL")
+  parser.add_argument("--seed", type=int, default=0)
+  args = parser.parse_args()
+
+  server = serve(
+    args.host,
+    args.port,
+    latency=args.latency,
+    load_latency=args.load_latency,
+    tps=args.tps,
+    prompt_tps=args.prompt_tps,
+    context_slowdown=args.context_slowdown,
+    responses=_load_responses(args.responses),
+    error_rate=args.error_rate,
+    parallel=args.parallel,
+    seed=args.seed,
+  )
+  print(f"fake ollama listening on http://{args.host}:{args.port}")
+
+  try:
+    while True:
+      time.sleep(3600)
+  except KeyboardInterrupt:
+    server.shutdown()
@@ -0,0 +1,79 @@
+import shutil, subprocess, sys, tempfile, time, statistics
+
+import tracing
+
+class Gradle:
+  """
+  build backend for one project.
+
+  with `daemon=True` every build goes through the same long-lived gradle daemon, so JVM startup and
+  build configuration are paid once per worker instead of once per file. the daemons are registered in
+  `registry` (a fresh temporary directory unless one is shared between workers), so `stop()` shuts down
+  this run's daemons and no others. with `daemon=False` every build runs on a fresh `--no-daemon` JVM.
+  """
+  def __init__(self, project=".", daemon=True, registry=None):
+    self.project = project
+    self.daemon = daemon
+    self.registry = registry or (tempfile.mkdtemp(prefix="j2k-gradle-daemons-") if daemon else None)
+    self.timings = []
+
+  def _command(self, *args) -> list[str]:
+    if not self.daemon:
+      return ["./gradlew", *args, "--no-daemon"]
+    return ["./gradlew", *args, f"-Dorg.gradle.daemon.registry.base={self.registry}"]
+
+  def run(self, *args, check=False, timeout=1800):
+    command = self._command(*args)
+
+    start = time.perf_counter()
+    try:
+      with tracing.span(f"gradle {args[0]}", project=str(self.project)):
+        return subprocess.run(
+          command,
+          cwd=self.project,
+          check=check,
+          stdout=subprocess.PIPE,
+          stderr=subprocess.PIPE,
+          timeout=timeout
+        )
+    finally:
+      self.timings.append((args, time.perf_counter() - start))
+
+  def build_seconds(self) -> float:
+    return sum(seconds for _, seconds in self.timings)
+
+  def stop(self):
+    """
+    shut down the daemons registered in this build's registry, leaving other gradle daemons alone
+    """
+    if self.daemon:
+      subprocess.run(self._command("--stop"), cwd=self.project, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+      shutil.rmtree(self.registry, ignore_errors=True)
+
+def _time_build(gradle: Gradle) -> float:
+  before = gradle.build_seconds()
+  gradle.run("clean", check=True)
+  gradle.run("test", "--continue", "--rerun-tasks")
+  return gradle.build_seconds() - before
+
+def compare(project=".", runs=3):
+  """
+  time the per-file build on the unconverted project through the cold path and through a warm daemon
+  """
+  cold = Gradle(project, daemon=False)
+  cold_times = [_time_build(cold) for _ in range(runs)]
+
+  warm = Gradle(project, daemon=True)
+  _time_build(warm) # first build starts the daemon, which every later build reuses
+  warm_times = [_time_build(warm) for _ in range(runs)]
+  warm.stop()
+
+  cold_mean = statistics.mean(cold_times)
+  warm_mean = statistics.mean(warm_times)
+
+  print(f"cold (--no-daemon): {cold_mean:.1f}s per file")
+  print(f"warm daemon: {warm_mean:.1f}s per file")
+  print(f"saved: {cold_mean - warm_mean:.1f}s per file ({(1 - warm_mean / cold_mean) * 100:.0f}%)")
+
+if __name__ == "__main__":
+  compare(runs=int(sys.argv[1]) if len(sys.argv) > 1 else 3)
@@ -0,0 +1,383 @@
+import json, os, threading, time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
+
+import tracing
+from cassette import Cassette
+from conversion_cache import ConversionCache, cache_key
+
+config = None
+
+with open("config.json", "r") as f:
+  config = json.loads(f.read())
+
+def _base_url():
+  # OLLAMA_HOST wins over config.json, so a run can be pointed at `fake_ollama.py` without editing files
+  host = os.getenv("OLLAMA_HOST") or config.get("ollama_url", "http://localhost:11434")
+  if "://" not in host:
+    host = f"http://{host}"
+  return host.rstrip("/")
+
+OLLAMA_URL = f"{_base_url()}/api/chat"
+
+HTTP = {
+  "pool_size": 8,
+  "retries": 3,
+  "backoff": 0.5,
+  "connect_timeout": 5,
+  "read_timeout": 600,
+  **config.get("http", {}),
+}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+class _Retry(Retry):
+  """
+  retry policy in which only a read timeout counts as a read error. urllib3 also counts a reset or aborted
+  connection as one, which `read=0` would then never retry; here those fall under the other errors
+  """
+  def _is_read_error(self, err) -> bool:
+    return isinstance(err, ReadTimeoutError)
+
+def session() -> requests.Session:
+  """
+  return this process's pooled keep-alive session to the model server.
+
+  sessions are per process, since pooled sockets inherited by a forked worker would be shared with its parent
+  """
+  pid = os.getpid()
+  with _sessions_lock:
+    if pid not in _sessions:
+      retry = _Retry(
+        total=HTTP["retries"],
+        backoff_factor=HTTP["backoff"],
+        status_forcelist=[500, 502, 503, 504],
+        # generation requests are POSTs, which urllib3 won't retry by default
+        allowed_methods=None,
+        # a read timeout means the server got the request and may still be generating, so retrying it would
+        # multiply the read timeout instead of bounding it; reset connections are still retried
+        read=0,
+        raise_on_status=False,
+      )
+      adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP["pool_size"], max_retries=retry)
+
+      _sessions[pid] = requests.Session()
+      _sessions[pid].mount("http://", adapter)
+      _sessions[pid].mount("https://", adapter)
+    return _sessions[pid]
+
+CACHE = None
+if config.get("conversion_cache"):
+  CACHE = ConversionCache(config["conversion_cache"], config.get("conversion_cache_max_mb", 512) * 1024 * 1024)
+
+# "record" saves every model response to the cassette, "replay" answers every request from it
+CASSETTE = None
+if config.get("cassette_mode"):
+  CASSETTE = Cassette(config.get("cassette", "cassette.jsonl.gz"), config["cassette_mode"])
+
+# stream completions and stop them as soon as the answer is complete (see `TagStream`)
+STREAM = config.get("stream", False)
+# cancel runaway streamed completions after this many tokens or seconds; 0 disables the limit
+STREAM_MAX_TOKENS = config.get("stream_max_tokens", 0)
+STREAM_MAX_SECONDS = config.get("stream_max_seconds", 0)
+
+# how long ollama keeps the model loaded after each request; -1 pins it until `unload()`
+KEEP_ALIVE = config.get("keep_alive", -1)
+
+# size num_ctx per request to the smallest of these buckets that holds the prompt and the expected output
+AUTO_NUM_CTX = config.get("auto_num_ctx", False)
+NUM_CTX_BUCKETS = sorted(config.get("num_ctx_buckets", [2048, 4096, 8192, 16384, 32768]))
+# room left for a reasoning model's <think> block on top of the answer itself
+REASONING_TOKENS = config.get("reasoning_tokens", 2048)
+# source code tokenizes denser than prose, so this errs towards overestimating
+CHARS_PER_TOKEN = 3
+
+# running totals for this process; callers diff snapshots to attribute them to a single conversion
+_stats_lock = threading.Lock()
+stats = {
+  "cache_hits": 0,
+  "cache_misses": 0,
+  "streams": 0,
+  "early_stops": 0,
+  "ttft_seconds": 0.0,
+  "stream_tokens": 0,
+  "stream_seconds": 0.0,
+  "load_seconds": 0.0,
+  "context_overflows": 0,
+  "prompt_tokens": 0,
+  "output_tokens": 0,
+  "skipped_requests": 0,
+  "function_memo_hits": 0,
+  "function_memo_misses": 0,
+  "chunks": 0,
+}
+
+def snapshot() -> dict:
+  with _stats_lock:
+    return dict(stats)
+
+def _count(key, amount=1):
+  with _stats_lock:
+    stats[key] += amount
+
+def count(key, amount=1):
+  """
+  add to a running total from outside the client, such as model requests a caller answered without the model
+  """
+  _count(key, amount)
+
+def since(before) -> dict:
+  return {key: stats[key] - before.get(key, 0) for key in stats}
+
+def estimate_tokens(text) -> int:
+  return -(-len(text) // CHARS_PER_TOKEN)
+
+def context_size(messages, output_tokens):
+  """
+  return the smallest num_ctx bucket that holds `messages` plus `output_tokens` of reply, or None when
+  even the largest is too small
+  """
+  # the chat template adds a few tokens of role markers around every message
+  needed = sum(estimate_tokens(str(m.get("content", ""))) + 8 for m in messages) + output_tokens
+  return next((bucket for bucket in NUM_CTX_BUCKETS if bucket >= needed), None)
+
+def _sized(payload, output_tokens) -> dict:
+  num_ctx = context_size(payload["messages"], output_tokens)
+  if num_ctx is None:
+    # ollama would silently drop the start of the prompt, so say so; the largest bucket is the best left
+    _count("context_overflows")
+    num_ctx = NUM_CTX_BUCKETS[-1]
+    print(f"warning: request needs more than num_ctx {num_ctx} and will be truncated")
+
+  return {**payload, "options": {**payload.get("options", {}), "num_ctx": num_ctx}}
+
+class TagStream:
+  """
+  incremental detector for the end of the answer in a streamed completion: the `count`-th `close` tag, only
+  counting those after the first `after` tag when one is given. anything inside a <think> block is ignored,
+  since reasoning models draft answers there too
+  """
+  def __init__(self, close="</kotlin>", after=None, count=1):
+    self.close = close
+    self.after = after
+    self.count = count
+    self.tags = [tag for tag in ("<think>", after, close) if tag]
+    self.longest = max(len(tag) for tag in self.tags + ["</think>"])
+
+    self.text = ""
+    self.position = 0
+    self.thinking = False
+    self.armed = after is None
+    self.seen = 0
+
+  def feed(self, chunk) -> bool:
+    """
+    add the next piece of the completion, returning whether the answer is now complete
+    """
+    self.text += chunk
+
+    while True:
+      if self.thinking:
+        end = self.text.find("</think>", self.position)
+        if end == -1:
+          break
+        self.thinking = False
+        self.position = end + len("</think>")
+        continue
+
+      found = [(index, tag) for tag in self.tags if (index := self.text.find(tag, self.position)) != -1]
+      if not found:
+        break
+
+      index, tag = min(found)
+      self.position = index + len(tag)
+
+      if tag == "<think>":
+        self.thinking = True
+      elif tag == self.after:
+        self.armed = True
+      elif tag == self.close and self.armed:
+        self.seen += 1
+        if self.seen >= self.count:
+          return True
+
+    # a tag may be split across chunks, so the next search starts just early enough to catch it
+    self.position = max(self.position, len(self.text) - self.longest + 1)
+    return False
+
+def _request_key(payload, until=None) -> str:
+  # everything that determines the completion: model, the fully assembled messages and sampling options,
+  # and where a stream is cut off, since that reply ends early
+  parts = [payload["model"], payload["messages"], payload.get("options", {})]
+  if STREAM and until:
+    parts.append({"until": [until.close, until.after, until.count]})
+  return cache_key(*parts)
+
+def _post(key, payload, timeout) -> str:
+  if CASSETTE and CASSETTE.mode == "replay":
+    return CASSETTE.replay(key)
+
+  resp = session().post(OLLAMA_URL, json=payload, timeout=(HTTP["connect_timeout"], timeout or HTTP["read_timeout"]))
+  resp.raise_for_status()
+
+  if CASSETTE:
+    CASSETTE.record(key, payload, resp.text)
+  return resp.text
+
+def _assemble(body) -> dict:
+  """
+  fold a streamed (ndjson) response body into the shape of a non-streamed response
+  """
+  chunks = [json.loads(line) for line in body.splitlines() if line.strip()]
+  data = dict(chunks[-1]) if chunks and chunks[-1].get("done") else {"done": False, "done_reason": "cancelled"}
+  data["message"] = {
+    "role": "assistant",
+    "content": "".join(chunk.get("message", {}).get("content", "") for chunk in chunks),
+  }
+  return data
+
+def _stream(key, payload, timeout, until) -> dict:
+  if CASSETTE and CASSETTE.mode == "replay":
+    return _assemble(CASSETTE.replay(key))
+
+  start = time.perf_counter()
+  first_token = None
+  tokens = 0
+  lines = []
+  stopped = None
+
+  resp = session().post(
+    OLLAMA_URL,
+    json={**payload, "stream": True},
+    timeout=(HTTP["connect_timeout"], timeout or HTTP["read_timeout"]),
+    stream=True
+  )
+  try:
+    resp.raise_for_status()
+    # ollama sends ndjson without a charset
+    resp.encoding = "utf-8"
+
+    for line in resp.iter_lines(decode_unicode=True):
+      if not line:
+        continue
+      lines.append(line)
+
+      chunk = json.loads(line)
+      if chunk.get("done"):
+        break
+
+      piece = chunk.get("message", {}).get("content", "")
+      if piece:
+        first_token = first_token or time.perf_counter()
+        tokens += 1
+
+      if until and until.feed(piece):
+        stopped = "until"
+        break
+      if (STREAM_MAX_TOKENS and tokens >= STREAM_MAX_TOKENS) \
+          or (STREAM_MAX_SECONDS and time.perf_counter() - start >= STREAM_MAX_SECONDS):
+        stopped = "limit"
+        break
+  finally:
+    # closing an unfinished stream drops the connection, which is what makes ollama stop generating
+    resp.close()
+
+  end = time.perf_counter()
+  body = "\n".join(lines)
+
+  with _stats_lock:
+    stats["streams"] += 1
+    stats["early_stops"] += int(stopped is not None)
+    if first_token:
+      stats["ttft_seconds"] += first_token - start
+      stats["stream_tokens"] += tokens
+      stats["stream_seconds"] += end - first_token
+
+  if CASSETTE:
+    CASSETTE.record(key, payload, body)
+
+  data = _assemble(body)
+  if stopped == "until":
+    # the answer was complete; only what came after it was cancelled
+    data["done_reason"] = "until"
+  # a cancelled stream never gets the final chunk with ollama's counts
+  data.setdefault("eval_count", tokens)
+  return data
+
+def _load(model, keep_alive, options=None) -> dict:
+  # a chat request without messages only loads (or unloads) the model
+  payload = {"model": model, "messages": [], "keep_alive": keep_alive, "stream": False}
+  if options:
+    payload["options"] = options
+
+  resp = session().post(OLLAMA_URL, json=payload, timeout=(HTTP["connect_timeout"], HTTP["read_timeout"]))
+  resp.raise_for_status()
+  return resp.json()
+
+def warm(model, options=None) -> float:
+  """
+  load `model` and pin it in memory for the rest of the run, returning the seconds the load took.
+
+  `options` should carry the `num_ctx` the conversions use, since ollama reloads the model when it changes
+  """
+  if CASSETTE and CASSETTE.mode == "replay":
+    return 0.0
+
+  start = time.perf_counter()
+  with tracing.span("model load", model=model):
+    data = _load(model, KEEP_ALIVE, options)
+  # ollama doesn't always report load_duration for a bare load, so fall back to the wall time
+  return data.get("load_duration", 0) / 1e9 or time.perf_counter() - start
+
+def unload(model):
+  """
+  release `model` now instead of waiting for its keep_alive to run out
+  """
+  if CASSETTE and CASSETTE.mode == "replay":
+    return
+
+  with tracing.span("model unload", model=model):
+    _load(model, 0)
+
+def chat(payload, timeout=None, until=None, output_tokens=None) -> dict:
+  """
+  send a chat request to ollama and return the decoded response, answering repeated requests from the conversion cache
+
+  `timeout` overrides the configured read timeout for this request. when streaming is on, `until` (a
+  `TagStream`) ends generation as soon as the answer is complete; the content is then cut off there.
+  with `auto_num_ctx`, `output_tokens` (the expected reply length) replaces the payload's num_ctx with
+  the smallest bucket that fits
+  """
+  if AUTO_NUM_CTX and output_tokens is not None:
+    payload = _sized(payload, output_tokens)
+
+  key = _request_key(payload, until)
+  payload = {"keep_alive": KEEP_ALIVE, **payload}
+
+  # a recording must hold every request's raw response, so it reads nothing from the cache
+  if CACHE and not (CASSETTE and CASSETTE.mode == "record"):
+    cached = CACHE.get(key)
+    if cached is not None:
+      _count("cache_hits")
+      return json.loads(cached)
+    _count("cache_misses")
+
+  with tracing.span("llm request", model=payload["model"]):
+    if STREAM:
+      data = _stream(key, payload, timeout, until)
+    else:
+      data = json.loads(_post(key, payload, timeout))
+
+  # time spent loading the model before this request; near zero while it stays resident
+  _count("load_seconds", data.get("load_duration", 0) / 1e9)
+  _count("prompt_tokens", data.get("prompt_eval_count", 0))
+  _count("output_tokens", data.get("eval_count", 0))
+
+  # a reply cut off by stream_max_tokens or stream_max_seconds is not repeatable, so it is never cached
+  if CACHE and (data.get("done") or data.get("done_reason") == "until"):
+    CACHE.put(key, json.dumps(data))
+
+  return data
@@ -0,0 +1,124 @@
+"""
+compare conversion prompts on the same files: prompt and output tokens, conversion time and score.
+
+  python prompt_benchmark.py v2 v8 [--files src/main/java/.../Owner.java ...]
+  python prompt_benchmark.py v3 v3:FUNCTION_CONTEXT=slice
+
+run it from the project, like `scoring.py`. each version converts every file in turn, and each conversion
+is scored with the same build `scoring.py` uses, one file at a time. a version can override constants of its
+module after a colon, to compare settings of one prompt. v3's function memo is off, so every version pays for
+its own conversions. prompt and output tokens are ollama's `prompt_eval_count` and `eval_count`. the
+conversions and per-file numbers are written to `prompt_benchmark/`.
+"""
+import argparse, importlib, json, pathlib, time
+
+import ollama_client
+import scoring
+import validation
+from gradle import Gradle
+
+def _variant(version):
+  """
+  split "v3:NAME=value,..." into the conversion module and the module constants to override
+  """
+  name, _, settings = version.partition(":")
+  overrides = {}
+  for setting in filter(None, settings.split(",")):
+    key, _, value = setting.partition("=")
+    try:
+      overrides[key] = json.loads(value)
+    except json.JSONDecodeError:
+      overrides[key] = value
+  return importlib.import_module(f"{name}_conversion"), overrides
+
+def benchmark(version, files, gradle) -> list[dict]:
+  module, overrides = _variant(version)
+  # memoised functions would carry one version's conversions, and none of their cost, into the next
+  if hasattr(module, "FUNCTION_MEMO"):
+    overrides.setdefault("FUNCTION_MEMO", None)
+  saved = {key: getattr(module, key) for key in overrides}
+  for key, value in overrides.items():
+    setattr(module, key, value)
+
+  try:
+    return _benchmark(version, module, files, gradle)
+  finally:
+    for key, value in saved.items():
+      setattr(module, key, value)
+
+def _benchmark(version, module, files, gradle) -> list[dict]:
+  out_dir = pathlib.Path("prompt_benchmark") / version.replace(":", "_").replace(",", "_")
+  out_dir.mkdir(parents=True, exist_ok=True)
+
+  rows = []
+  for file in files:
+    java_code = file.read_text()
+    before = ollama_client.snapshot()
+    start = time.perf_counter()
+
+    try:
+      kotlin_code = module.convert(java_code)
+    except Exception as e:
+      print(f"{version} {file.name}: conversion failed ({e!r})")
+      kotlin_code = None
+
+    llm = ollama_client.since(before)
+    row = {
+      "version": version,
+      "path": str(file),
+      "convert_seconds": time.perf_counter() - start,
+      "prompt_tokens": llm["prompt_tokens"],
+      "output_tokens": llm["output_tokens"],
+      "score": 0.0,
+      "failed_checks": None,
+    }
+
+    if kotlin_code is not None:
+      (out_dir / file.name).with_suffix(".kt").write_text(kotlin_code)
+      row["failed_checks"] = validation.validate(java_code, kotlin_code)
+      result = scoring.score_conversion({"path": str(file), "java": java_code, "kotlin": kotlin_code}, gradle)
+      row["score"] = result["score"]
+
+    print(f"{version} {file.name}: score={row['score']} prompt tokens={row['prompt_tokens']} output tokens={row['output_tokens']} {row['convert_seconds']:.1f}s")
+    rows.append(row)
+
+  return rows
+
+def summarise(rows_by_version):
+  width = max(8, *(len(version) for version in rows_by_version))
+  print(f"{'version':<{width}} {'files':>5} {'prompt tokens':>14} {'output tokens':>14} {'per file':>9} {'convert':>9} {'mean score':>11} {'valid':>6}")
+  for version, rows in rows_by_version.items():
+    prompt_tokens = sum(row["prompt_tokens"] for row in rows)
+    tokens = sum(row["output_tokens"] for row in rows)
+    seconds = sum(row["convert_seconds"] for row in rows)
+    score = sum(row["score"] for row in rows) / len(rows)
+    valid = sum(1 for row in rows if row["failed_checks"] == [])
+    print(f"{version:<{width}} {len(rows):>5} {prompt_tokens:>14} {tokens:>14} {tokens / len(rows):>9.0f} {seconds:>8.1f}s {score:>11.3f} {valid:>6}")
+
+def main():
+  parser = argparse.ArgumentParser(description="compare conversion prompts on tokens, time and score")
+  parser.add_argument("versions", nargs="+", help="conversion modules to compare, e.g. v2 v8 or v3 v3:FUNCTION_CONTEXT=slice")
+  parser.add_argument("--files", nargs="*", help="java files to convert; defaults to every file scoring.py converts")
+  args = parser.parse_args()
+
+  files = [pathlib.Path(f) for f in args.files] if args.files else sorted(
+    file for file in scoring.get_java_files("src/") if "test" not in str(file).lower()
+  )
+
+  if ollama_client.CACHE:
+    print("warning: the conversion cache is on, so repeated conversions report no tokens and almost no time")
+
+  gradle = Gradle(".", daemon=scoring.GRADLE_DAEMON)
+  ollama_client.warm(scoring.MODEL, scoring.WARM_OPTIONS)
+  try:
+    rows_by_version = {version: benchmark(version, files, gradle) for version in args.versions}
+  finally:
+    ollama_client.unload(scoring.MODEL)
+    gradle.stop()
+
+  summarise(rows_by_version)
+  with open(pathlib.Path("prompt_benchmark") / "results.json", "w") as f:
+    json.dump(rows_by_version, f, indent=2)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,129 @@
+import hashlib, json, pathlib, re, sqlite3, sys, time
+from contextlib import contextmanager
+
+SCORE_LINE = re.compile(r"(.+?): score=([\d.]+) \(ran (\d+) tests?, (\d+) passing\)")
+
+COLUMNS = [
+  "path", "name", "version", "model", "score",
+  "tests", "runnable", "passed", "failures", "errors", "skipped",
+  "convert_seconds", "build_seconds", "output_hash", "llm", "created",
+]
+
+class ResultsStore:
+  """
+  one row per scored file and (version, model), in a single sqlite file.
+
+  rows are keyed on the file's full path, so classes with the same name in different packages are kept
+  apart. writes are single upserts under WAL, so several scoring processes can share a store
+  """
+  def __init__(self, path="results.sqlite"):
+    self.path = str(path)
+
+    with self._connect() as db:
+      db.execute("PRAGMA journal_mode=WAL")
+      db.execute("""CREATE TABLE IF NOT EXISTS results (
+        path TEXT NOT NULL,
+        name TEXT NOT NULL,
+        version TEXT NOT NULL,
+        model TEXT NOT NULL,
+        score REAL NOT NULL,
+        tests INTEGER NOT NULL,
+        runnable INTEGER NOT NULL,
+        passed INTEGER NOT NULL,
+        failures INTEGER NOT NULL,
+        errors INTEGER NOT NULL,
+        skipped INTEGER NOT NULL,
+        convert_seconds REAL,
+        build_seconds REAL,
+        output_hash TEXT,
+        llm TEXT,
+        created REAL NOT NULL,
+        PRIMARY KEY (version, model, path)
+      )""")
+
+  @contextmanager
+  def _connect(self):
+    db = sqlite3.connect(self.path, timeout=30)
+    db.row_factory = sqlite3.Row
+    try:
+      with db:
+        yield db
+    finally:
+      db.close()
+
+  def record(self, result, version, model):
+    summary = result["summary"]
+    row = {
+      "path": result["path"],
+      "name": pathlib.Path(result["path"]).name,
+      "version": version,
+      "model": model,
+      "score": result["score"],
+      "tests": summary["tests"],
+      "runnable": summary["runnable"],
+      "passed": summary["passed"],
+      "failures": summary["failures"],
+      "errors": summary["errors"],
+      "skipped": summary["skipped"],
+      "convert_seconds": result.get("convert_seconds"),
+      "build_seconds": result.get("build_seconds"),
+      "output_hash": hashlib.sha256(result["kotlin"].encode("utf-8")).hexdigest() if "kotlin" in result else None,
+      "llm": json.dumps(result["llm"]) if "llm" in result else None,
+      "created": time.time(),
+    }
+
+    with self._connect() as db:
+      db.execute(
+        f"INSERT OR REPLACE INTO results ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})",
+        [row[column] for column in COLUMNS]
+      )
+
+  def scored_paths(self, version, model) -> set[str]:
+    with self._connect() as db:
+      rows = db.execute("SELECT path FROM results WHERE version = ? AND model = ?", (version, model))
+      return {row["path"] for row in rows}
+
+  def rows(self, version=None, model=None) -> list[dict]:
+    query, args = "SELECT * FROM results WHERE 1 = 1", []
+    if version is not None:
+      query, args = query + " AND version = ?", args + [version]
+    if model is not None:
+      query, args = query + " AND model = ?", args + [model]
+
+    with self._connect() as db:
+      return [dict(row) for row in db.execute(query + " ORDER BY created", args)]
+
+  def import_scores_txt(self, scores_path, version, model):
+    """
+    load rows from an old `scores.txt`, which only recorded file names; they are stored with the name as their path
+    """
+    for line in pathlib.Path(scores_path).read_text().splitlines():
+      match = SCORE_LINE.match(line)
+      if not match:
+        continue
+
+      name, score, runnable, passed = match.group(1).strip(), float(match.group(2)), int(match.group(3)), int(match.group(4))
+      self.record({
+        "path": name,
+        "score": score,
+        "summary": {
+          "tests": runnable,
+          "skipped": 0,
+          "failures": runnable - passed,
+          "errors": 0,
+          "runnable": runnable,
+          "passed": passed,
+        },
+      }, version, model)
+
+  def export_scores_txt(self, scores_path, version=None, model=None):
+    lines = [
+      f"{row['path']}: score={row['score']} (ran {row['runnable']} tests, {row['passed']} passing)\n"
+      for row in self.rows(version, model)
+    ]
+    pathlib.Path(scores_path).write_text("".join(lines))
+
+if __name__ == "__main__":
+  # python results_store.py [results.sqlite] [scores.txt]
+  store = ResultsStore(sys.argv[1] if len(sys.argv) > 1 else "results.sqlite")
+  store.export_scores_txt(sys.argv[2] if len(sys.argv) > 2 else "scores.txt")
@@ -1,51 +1,99 @@
-import requests, re, pathlib, subprocess
+import requests, re, pathlib, json, multiprocessing, shutil, queue, threading, time
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
 import xml.etree.ElementTree as ET
 
-import v6_conversion
+import v2_conversion
+import chunking
+import ollama_client
+import worktrees
+import tracing
+import coverage_index
+import validation
+from results_store import ResultsStore
+from gradle import Gradle
+
+config = None
+
+with open("config.json", "r") as f:
+  config = json.loads(f.read())
+
+MODEL = config["model"]
+VERSION = v2_conversion.__name__.split("_")[0]
+
+RESULTS_PATH = config.get("results", "results.sqlite")
+SCORES_PATH = "scores.txt"
+TRACE_PATH = config.get("trace", "trace.json")
+
+# number of isolated project copies scored in parallel; 1 scores in place
+WORKERS = config.get("workers", 1)
+# reuse one warm gradle daemon per worker instead of a cold `--no-daemon` build per file
+GRADLE_DAEMON = config.get("gradle_daemon", True)
+# compile before testing, so files that don't compile skip the test suite entirely
+COMPILE_GATE = config.get("compile_gate", True)
+# keep build outputs between files, relying on the build cache and incremental compilation instead of `clean`
+INCREMENTAL = config.get("incremental", False)
+CACHE_FLAGS = ["--build-cache", "--configuration-cache"]
+# only run the tests that cover the converted file, according to a one-time jacoco pass (`coverage_index.py`)
+TEST_SELECTION = config.get("test_selection", False)
+# convert up to this many files ahead while the current one builds; 0 converts and scores strictly in turn
+PREFETCH = config.get("prefetch", 0)
+# score this many files per build, bisecting groups that fail; 1 builds once per file
+BATCH_SIZE = max(1, config.get("batch_size", 1))
+# convert with this small model first and only send files that fail `validation.py` on to `model`; null converts with `model` only
+CASCADE_MODEL = config.get("cascade_model")
+# convert files longer than this many lines one type declaration at a time (`chunking.py`); 0 converts whole files
+CHUNK_LINES = config.get("chunk_lines", 0)
+# chunks of one file converted at once
+CHUNK_CONCURRENCY = config.get("chunk_concurrency", 4)
+# the context every conversion prompt asks for; warming with a different num_ctx would just load the model twice
+WARM_OPTIONS = {"num_ctx": 8192 * 2}
+
+# the summary of a file that never got as far as running a test
+EMPTY_SUMMARY = {
+  "tests": 0,
+  "skipped": 0,
+  "failures": 0,
+  "errors": 0,
+  "runnable": 0,
+  "passed": 0,
+  "diagnostics": [],
+}
+
+COMPILER_ERROR = re.compile(r"^e: .*|^.*\.(?:java|kt):\d+(?::\d+)?: error: .*", re.MULTILINE)
 
 def get_java_files(directory="."):
   return list(pathlib.Path(directory).rglob("*.java"))
 
 #    3: define result function to score by compilation and then tests
 
-def get_score(base=0) -> float:
+def compiler_diagnostics(process) -> list[str]:
   """
-  return normalised score of percentage of tests passing, truncated to `base` if no compilation (default=0)
+  return the kotlinc/javac error lines from a finished gradle process
   """
-  empty = {
-    "tests": 0,
-    "skipped": 0,
-    "failures": 0,
-    "errors": 0,
-    "runnable": 0,
-    "passed": 0,
-  }
+  output = process.stdout.decode(errors="ignore") + process.stderr.decode(errors="ignore")
+  return [line.strip() for line in COMPILER_ERROR.findall(output)]
 
-  try:
-    subprocess.run(["./gradlew", "clean"], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-  except:
-    return float(base), empty
-
-  subprocess.run(
-    ["./gradlew", "test", "--no-daemon", "--continue", "--rerun-tasks"],
-    check=False,
-    stdout=subprocess.PIPE,
-    stderr=subprocess.PIPE,
-    timeout=1800
-  )
-
-  report_glob_patterns = [
-    "**/build/test-results/test/*.xml",
-    "**/build/test-results/*Test/*.xml",
-    "**/build/test-results/*/*.xml",
-  ]
-  xml_files = []
+def stale_java_classes(project, relative_path) -> list[pathlib.Path]:
+  """
+  return classes compiled from the java file at `relative_path` that are still in gradle's java outputs
+  """
+  relative_path = pathlib.Path(relative_path)
+  parts = relative_path.parts[:-1]
+  package = pathlib.Path(*parts[parts.index("java") + 1:]) if "java" in parts else None
 
-  for pattern in report_glob_patterns:
-    xml_files.extend(pathlib.Path(".").glob(pattern))
+  stale = []
+  for classes in pathlib.Path(project).glob("**/build/classes/java/main"):
+    directory = classes / package if package is not None else classes
+    pattern = "" if package is not None else "**/"
+    stale.extend(directory.glob(f"{pattern}{relative_path.stem}.class"))
+    stale.extend(directory.glob(f"{pattern}{relative_path.stem}$*.class"))
 
-  xml_files = list(set(xml_files)) # de-dupe
+  return stale
 
+def parse_junit_reports(xml_files):
+  """
+  return the total tests, failures, errors and skipped tests across junit xml reports
+  """
   total_tests = 0
   total_fails = 0
   total_errs = 0
@@ -69,11 +117,92 @@ def get_score(base=0) -> float:
         total_skips += int(suite.attrib.get("skipped", suite.attrib.get("ignored", "0")))
     except:
       continue
-  
+
+  return total_tests, total_fails, total_errs, total_skips
+
+def get_score(base=0, gradle=None, converted=None, tests=None) -> float:
+  """
+  return normalised score of percentage of tests passing, truncated to `base` if no compilation (default=0)
+
+  `converted` lists the java files currently replaced by kotlin, and `tests` restricts the run to the given
+  test classes; by default the whole suite runs
+  """
+  gradle = gradle or Gradle(".", daemon=GRADLE_DAEMON)
+  project = gradle.project
+
+  if INCREMENTAL:
+    # outputs are kept, but reports from the previous file must never be read as this file's results
+    for results in pathlib.Path(project).glob("**/build/test-results"):
+      shutil.rmtree(results, ignore_errors=True)
+    flags = CACHE_FLAGS
+  else:
+    try:
+      gradle.run("clean", check=True)
+    except:
+      return float(base), EMPTY_SUMMARY
+    flags = ["--rerun-tasks"]
+
+  # only main and test sources are compiled by the gate (through gradle's warm kotlin daemon); the suite
+  # runs afterwards against these outputs, so a file that doesn't compile never pays for `test`
+  test_filters = [arg for test in tests or [] for arg in ("--tests", test)]
+
+  build = ["testClasses"] if COMPILE_GATE else ["test", "--continue", *test_filters]
+  built = gradle.run(*build, *flags)
+
+  # a failed build never reached compileJava, so the deleted java class is still there and says nothing
+  if INCREMENTAL and built.returncode == 0 and any(stale_java_classes(project, path) for path in converted or []):
+    # incremental compilation left the deleted java class on the classpath, so rebuild this file from scratch
+    try:
+      gradle.run("clean", check=True)
+    except:
+      return float(base), EMPTY_SUMMARY
+    built = gradle.run(*build, *flags)
+
+  if COMPILE_GATE:
+    if built.returncode != 0:
+      return float(base), {**EMPTY_SUMMARY, "diagnostics": compiler_diagnostics(built)}
+
+    gradle.run("test", "--continue", *test_filters, *(CACHE_FLAGS if INCREMENTAL else []))
+
+  return summarise_reports(junit_reports(project), base)
+
+def junit_reports(project, test_classes=None) -> list[pathlib.Path]:
+  """
+  return the junit xml reports in `project`, only those of `test_classes` (and their nested classes) if given
+  """
+  report_glob_patterns = [
+    "**/build/test-results/test/*.xml",
+    "**/build/test-results/*Test/*.xml",
+    "**/build/test-results/*/*.xml",
+  ]
+  xml_files = []
+
+  for pattern in report_glob_patterns:
+    xml_files.extend(pathlib.Path(project).glob(pattern))
+
+  xml_files = list(set(xml_files)) # de-dupe
+
+  if test_classes is not None:
+    def suite(xml_path):
+      try:
+        return ET.parse(xml_path).getroot().attrib.get("name", "").split("$")[0]
+      except ET.ParseError:
+        return None
+    xml_files = [xml_path for xml_path in xml_files if suite(xml_path) in test_classes]
+
+  return xml_files
+
+def summarise_reports(xml_files, base=0):
+  """
+  return the score and test summary of the junit xml reports `xml_files`
+  """
+  with tracing.span("parse junit", reports=len(xml_files)):
+    total_tests, total_fails, total_errs, total_skips = parse_junit_reports(xml_files)
+
   runnable = total_tests - total_skips
   if runnable <= 0:
-    return float(base), empty
-  
+    return float(base), EMPTY_SUMMARY
+
   passed = runnable - (total_fails + total_errs)
   score = max(0.0, min(1.0, passed / runnable))
 
@@ -84,53 +213,438 @@ def get_score(base=0) -> float:
     "errors": total_errs,
     "runnable": runnable,
     "passed": passed,
+    "diagnostics": [],
   }
   return score, summary
 
-#    4: iterate through java files, converting to kotlin, scoring and then restoring
+#    4: convert a single java file to kotlin, then score it inside a project and restore it
 
-log_dir = pathlib.Path("logs")
-log_dir.mkdir(exist_ok=True)
+def convert_file(relative_path, project="."):
+  java_code = (pathlib.Path(project) / relative_path).read_text()
 
-already_checked = []
-scores_path = "scores.txt"
-scores_path_obj = pathlib.Path(scores_path)
+  start = time.perf_counter()
+  llm_before = ollama_client.snapshot()
+  cascade = None
 
-if scores_path_obj.exists():
-  with scores_path_obj.open("r") as f:
-    already_checked = [line.split(" ")[0][:-1] for line in f.readlines()]
+  with tracing.span("convert", file=str(relative_path)):
+    if CASCADE_MODEL:
+      conversion_output, cascade = _cascade_convert(java_code)
+    else:
+      conversion_output = _convert(java_code)
 
-for file in get_java_files("src/"):
-  if "test" not in str(file).lower():
-    if file.name in already_checked:
-      continue
+  llm = ollama_client.since(llm_before)
+  if cascade:
+    llm["cascade"] = cascade
 
-    # convert file to kotlin
-    java_code = file.read_text()
-    file.unlink()
+  return {
+    "path": str(relative_path),
+    "java": java_code,
+    "kotlin": conversion_output,
+    "convert_seconds": time.perf_counter() - start,
+    "llm": llm,
+  }
 
-    kotlin_path = file.with_suffix(".kt")
+def _convert(java_code, **kwargs):
+  if CHUNK_LINES and chunking.line_count(java_code) > CHUNK_LINES:
+    convert = lambda chunk: v2_conversion.convert(chunk, **kwargs)
+    return chunking.convert_in_chunks(java_code, convert, CHUNK_LINES, CHUNK_CONCURRENCY)
+  return v2_conversion.convert(java_code, **kwargs)
 
+def _cascade_convert(java_code):
+  """
+  convert with the small model, escalating to the configured model when the draft fails validation.
+  returns the kotlin and a record of what happened
+  """
+  start = time.perf_counter()
+  with tracing.span("draft", model=CASCADE_MODEL):
     try:
-      conversion_output = v2_conversion.convert(java_code)
-      kotlin_path.write_text(conversion_output)
+      draft = _convert(java_code, model=CASCADE_MODEL)
+      failures = validation.validate(java_code, draft)
+    except Exception as e:
+      # small models often don't produce the tags the response is parsed by at all
+      draft, failures = None, [f"no conversion ({type(e).__name__})"]
+  draft_seconds = time.perf_counter() - start
+
+  if not failures:
+    return draft, {"model": CASCADE_MODEL, "draft_seconds": draft_seconds, "failures": []}
+
+  start = time.perf_counter()
+  conversion_output = _convert(java_code)
+  return conversion_output, {
+    "model": MODEL,
+    "draft_seconds": draft_seconds,
+    "escalated_seconds": time.perf_counter() - start,
+    "failures": failures,
+  }
 
-      print(f"{file.name}: ", end="")
+def score_group(conversions, gradle):
+  """
+  swap every conversion in `conversions` into the project at once, score them together and restore the java sources
+  """
+  project = pathlib.Path(gradle.project)
+  swapped = []
 
-      score, summary = get_score()
+  try:
+    with tracing.span("write kotlin", files=len(conversions)):
+      for conversion in conversions:
+        file = project / conversion["path"]
+        file.unlink()
+        swapped.append(file)
+        file.with_suffix(".kt").write_text(conversion["kotlin"])
 
-      print(f"{file.name}: score={score} (ran {summary['runnable']} tests, {summary['passed']} passing)")
+    paths = [pathlib.Path(conversion["path"]) for conversion in conversions]
 
-      (log_dir/file.name).write_text(java_code)
-      (log_dir/kotlin_path.name).write_text(conversion_output)
+    # the group runs the union of its files' tests, or everything if any of them needs the full suite
+    selected = [covering_tests(path) for path in paths]
+    tests = None if any(t is None for t in selected) else sorted({test for tests in selected for test in tests})
 
-      with open(scores_path, "a") as f:
-        f.write(f"{file.name}: score={score} (ran {summary['runnable']} tests, {summary['passed']} passing)\n")
+    build_start = gradle.build_seconds()
+    score, summary = get_score(gradle=gradle, converted=paths, tests=tests)
+    build_seconds = gradle.build_seconds() - build_start
 
-      pass
-    finally:
-      # clean up
-      file.write_text(java_code)
+    # each file is credited with its own covering tests only, as it would have been scored alone; a file
+    # without coverage data runs the full suite alone too, which the group then did as well
+    members = [(score, summary)] * len(conversions)
+    if len(conversions) > 1 and summary["runnable"] > 0:
+      members = [
+        (score, summary) if own is None else summarise_reports(junit_reports(project, set(own)))
+        for own in selected
+      ]
 
+    return score, summary, build_seconds, members
+  finally:
+    # clean up
+    for file, conversion in zip(swapped, conversions):
+      file.write_text(conversion["java"])
+
+      kotlin_path = file.with_suffix(".kt")
       if kotlin_path.exists():
         kotlin_path.unlink()
+
+def score_conversion(conversion, gradle):
+  score, summary, build_seconds, _ = score_group([conversion], gradle)
+
+  return {
+    **conversion,
+    "score": score,
+    "summary": summary,
+    "build_seconds": build_seconds,
+  }
+
+def score_batch(conversions, gradle, build_share=0.0):
+  """
+  score a group of conversions with as few builds as possible.
+
+  the whole group is built and tested once; if it compiles and every test passes, each file is given that
+  result, as it would have scored alone. otherwise the group is split in half and each half is scored the
+  same way, down to single files, which are scored exactly as in one-at-a-time mode. a mostly-good group
+  therefore needs a logarithmic number of builds rather than one per file.
+
+  `build_share` is the per-file share of the build time already spent on failed enclosing groups
+  """
+  if len(conversions) == 1:
+    result = score_conversion(conversions[0], gradle)
+    result["build_seconds"] += build_share
+    return [result]
+
+  score, summary, build_seconds, members = score_group(conversions, gradle)
+  share = build_share + build_seconds / len(conversions)
+
+  if summary["runnable"] > 0 and score == 1.0:
+    return [
+      {**conversion, "score": member_score, "summary": member_summary, "build_seconds": share}
+      for conversion, (member_score, member_summary) in zip(conversions, members)
+    ]
+
+  middle = len(conversions) // 2
+  return score_batch(conversions[:middle], gradle, share) + score_batch(conversions[middle:], gradle, share)
+
+def _batches(items, size):
+  batch = []
+  for item in items:
+    batch.append(item)
+    if len(batch) >= size:
+      yield batch
+      batch = []
+  if batch:
+    yield batch
+
+_coverage = None
+
+def covering_tests(relative_path):
+  """
+  return the test classes to run for `relative_path`, or None to run the full suite
+  """
+  global _coverage
+  if not TEST_SELECTION:
+    return None
+
+  if _coverage is None:
+    _coverage = coverage_index.load_index()
+
+  # files without coverage data fall back to the full suite
+  return coverage_index.tests_for(_coverage, relative_path)
+
+# each pool process claims one worktree for its whole lifetime, so no two builds share a project
+_gradle = None
+
+def _init_worker(free_worktrees, registry):
+  global _gradle
+  # a forked worker starts with a copy of the driver's spans, which the driver already has
+  tracing.drain()
+  # every worker registers its daemon with the driver's registry, so the driver can stop them all
+  _gradle = Gradle(free_worktrees.get(), daemon=GRADLE_DAEMON, registry=registry)
+
+# spans recorded in a pool process travel back with its results, so the driver can write a single trace
+def _score_files_in_worktree(relative_paths):
+  results = score_batch([convert_file(path, _gradle.project) for path in relative_paths], _gradle)
+  return results, tracing.drain()
+
+def _score_batch_in_worktree(conversions):
+  return score_batch(conversions, _gradle), tracing.drain()
+
+#    5: iterate through java files, scoring each one and merging the results
+
+def prefetch_conversions(pending, depth):
+  """
+  convert `pending` on a background thread, running at most `depth` files ahead of the consumer.
+
+  yields `(file, conversion)` in order, where a failed conversion is the exception it raised
+  """
+  ready = queue.Queue(maxsize=depth)
+
+  def produce():
+    for file in pending:
+      try:
+        ready.put((file, convert_file(file)))
+      except Exception as e:
+        ready.put((file, e))
+    ready.put(None)
+
+  threading.Thread(target=produce, daemon=True).start()
+
+  while (item := ready.get()) is not None:
+    yield item
+
+def record_result(result, log_dir, store):
+  summary = result["summary"]
+  line = f"{result['path']}: score={result['score']} (ran {summary['runnable']} tests, {summary['passed']} passing)"
+
+  skipped = result.get("llm", {}).get("skipped_requests", 0)
+  if skipped:
+    line += f" [{skipped} model requests skipped]"
+
+  cascade = result.get("llm", {}).get("cascade")
+  if cascade and cascade["failures"]:
+    line += f" [escalated to {cascade['model']}: {', '.join(cascade['failures'])}]"
+
+  print(line)
+
+  # logs mirror the project layout, so classes with the same name in different packages don't overwrite each other
+  log_path = log_dir / result["path"]
+  log_path.parent.mkdir(parents=True, exist_ok=True)
+  log_path.write_text(result["java"])
+  log_path.with_suffix(".kt").write_text(result["kotlin"])
+
+  diagnostics_path = log_path.with_suffix(".diagnostics.txt")
+  if summary["diagnostics"]:
+    diagnostics_path.write_text("\n".join(summary["diagnostics"]) + "\n")
+  else:
+    # left over from an earlier run in which the file did not compile
+    diagnostics_path.unlink(missing_ok=True)
+
+  store.record(result, VERSION, MODEL)
+  # scores.txt is kept as an export of the store, for older tooling
+  store.export_scores_txt(SCORES_PATH, VERSION, MODEL)
+
+def report_timings(results, wall_seconds):
+  if not results:
+    return
+
+  mode = "warm daemon" if GRADLE_DAEMON else "cold --no-daemon"
+  convert_seconds = sum(r["convert_seconds"] for r in results)
+  build_seconds = sum(r["build_seconds"] for r in results)
+
+  print(f"gradle ({mode}): {build_seconds / len(results):.1f}s per file over {len(results)} files")
+  print(f"conversion: {convert_seconds:.1f}s, scoring: {build_seconds:.1f}s, wall time: {wall_seconds:.1f}s")
+
+  if ollama_client.CACHE:
+    hits = sum(r["llm"]["cache_hits"] for r in results)
+    misses = sum(r["llm"]["cache_misses"] for r in results)
+    print(f"conversion cache: {hits} hits, {misses} misses")
+
+  overflows = sum(r["llm"].get("context_overflows", 0) for r in results)
+  if overflows:
+    print(f"context overflows: {overflows} requests did not fit num_ctx {ollama_client.NUM_CTX_BUCKETS[-1]} and were truncated")
+
+  cascades = [r["llm"]["cascade"] for r in results if "cascade" in r["llm"]]
+  if cascades:
+    escalated = [c for c in cascades if c["failures"]]
+    draft_seconds = sum(c["draft_seconds"] for c in cascades)
+    print(f"cascade: {len(escalated)} of {len(cascades)} files escalated from {CASCADE_MODEL} to {MODEL}, drafts took {draft_seconds:.1f}s")
+
+    # what converting every file with the large model would have cost, judged from the files that needed it
+    if escalated:
+      large_mean = sum(c["escalated_seconds"] for c in escalated) / len(escalated)
+      saved = large_mean * len(cascades) - sum(c["draft_seconds"] + c.get("escalated_seconds", 0.0) for c in cascades)
+      print(f"cascade: about {saved:.1f}s saved against {MODEL} alone ({large_mean:.1f}s per file)")
+
+  skipped = sum(r["llm"].get("skipped_requests", 0) for r in results)
+  if skipped:
+    print(f"model requests skipped: {skipped}")
+
+  memo_hits = sum(r["llm"].get("function_memo_hits", 0) for r in results)
+  memo_lookups = memo_hits + sum(r["llm"].get("function_memo_misses", 0) for r in results)
+  if memo_lookups:
+    print(f"function memo: {memo_hits} of {memo_lookups} functions reused ({memo_hits / memo_lookups * 100:.0f}% hit rate)")
+
+  java_lines = sum(chunking.line_count(r["java"]) for r in results)
+  print(f"conversion rate: {java_lines / convert_seconds if convert_seconds else 0:.1f} java lines/s")
+
+  chunked = [r for r in results if r["llm"].get("chunks", 0)]
+  if chunked:
+    chunks = sum(r["llm"]["chunks"] for r in chunked)
+    print(f"chunking: {len(chunked)} files over {CHUNK_LINES} lines converted in {chunks} chunks")
+
+  load_seconds = sum(r["llm"].get("load_seconds", 0.0) for r in results)
+  print(f"model loads during conversion: {load_seconds:.1f}s")
+
+  if ollama_client.STREAM:
+    llm = [r["llm"] for r in results]
+    streams = sum(l.get("streams", 0) for l in llm)
+    if streams:
+      tokens = sum(l.get("stream_tokens", 0) for l in llm)
+      seconds = sum(l.get("stream_seconds", 0.0) for l in llm)
+      ttft = sum(l.get("ttft_seconds", 0.0) for l in llm) / streams
+      early = sum(l.get("early_stops", 0) for l in llm)
+      print(f"streaming: {streams} requests, {ttft:.2f}s mean time to first token, {tokens / seconds if seconds else 0:.1f} tokens/s, {early} stopped early")
+
+def _conversions(pending):
+  if PREFETCH > 0:
+    for file, conversion in prefetch_conversions(pending, PREFETCH):
+      if isinstance(conversion, Exception):
+        raise conversion
+      yield conversion
+  else:
+    for file in pending:
+      yield convert_file(file)
+
+def _score_serially(pending, log_dir, store, results):
+  gradle = Gradle(".", daemon=GRADLE_DAEMON)
+  try:
+    for batch in _batches(_conversions(pending), BATCH_SIZE):
+      for result in score_batch(batch, gradle):
+        results.append(result)
+        record_result(result, log_dir, store)
+  finally:
+    gradle.stop()
+
+def _score_in_pool(pending, log_dir, store, results):
+  copies = worktrees.create_worktrees(".", WORKERS)
+  daemons = Gradle(copies[0], daemon=GRADLE_DAEMON)
+  # workers must not be forked from a process whose threads (the prefetcher, or http and tracing in
+  # general) may hold a lock at that moment, so they start from a clean forkserver process instead
+  context = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+  free_worktrees = context.Manager().Queue()
+  for copy in copies:
+    free_worktrees.put(copy)
+
+  # results are merged by this process only, so scores.txt and logs/ have a single writer
+  def collect(future, files):
+    try:
+      batch_results, events = future.result()
+      tracing.extend(events)
+      for result in batch_results:
+        results.append(result)
+        record_result(result, log_dir, store)
+    except Exception as e:
+      print(f"{', '.join(file.name for file in files)}: failed ({e!r})")
+
+  try:
+    with ProcessPoolExecutor(max_workers=WORKERS, mp_context=context, initializer=_init_worker, initargs=(free_worktrees, daemons.registry)) as pool:
+      if PREFETCH > 0:
+        # conversions come from the prefetching thread; workers only build and test
+        in_flight = {}
+
+        def converted():
+          for file, conversion in prefetch_conversions(pending, PREFETCH):
+            if isinstance(conversion, Exception):
+              print(f"{file.name}: failed ({conversion!r})")
+              continue
+            yield conversion
+
+        for batch in _batches(converted(), BATCH_SIZE):
+          files = [pathlib.Path(conversion["path"]) for conversion in batch]
+          in_flight[pool.submit(_score_batch_in_worktree, batch)] = files
+
+          while len(in_flight) >= WORKERS:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+              collect(future, in_flight.pop(future))
+      else:
+        in_flight = {pool.submit(_score_files_in_worktree, batch): batch for batch in _batches(pending, BATCH_SIZE)}
+
+      for future in as_completed(in_flight):
+        collect(future, in_flight[future])
+  finally:
+    daemons.stop()
+    worktrees.remove_worktrees(copies)
+
+def main():
+  log_dir = pathlib.Path("logs")
+  log_dir.mkdir(exist_ok=True)
+
+  new_store = not pathlib.Path(RESULTS_PATH).exists()
+  store = ResultsStore(RESULTS_PATH)
+
+  if new_store and pathlib.Path(SCORES_PATH).exists():
+    store.import_scores_txt(SCORES_PATH, VERSION, MODEL)
+
+  # rows imported from an old scores.txt only know the file name, so they match any file with that name
+  already_checked = store.scored_paths(VERSION, MODEL)
+
+  pending = [
+    file for file in get_java_files("src/")
+    if "test" not in str(file).lower() and str(file) not in already_checked and file.name not in already_checked
+  ]
+
+  # ollama reloads the model whenever num_ctx changes, so files are converted smallest first and each
+  # context bucket is loaded once rather than once per switch
+  if ollama_client.AUTO_NUM_CTX:
+    pending.sort(key=lambda file: file.stat().st_size)
+
+  if TEST_SELECTION and not pathlib.Path(coverage_index.INDEX_PATH).exists():
+    print("building coverage index...")
+    gradle = Gradle(".", daemon=GRADLE_DAEMON)
+    try:
+      coverage_index.build_index(gradle)
+    finally:
+      gradle.stop()
+
+  results = []
+  start = time.perf_counter()
+
+  # load the model once up front and keep it resident, so no conversion pays for a cold load
+  if pending:
+    print(f"model load: {ollama_client.warm(MODEL, WARM_OPTIONS):.1f}s")
+    if CASCADE_MODEL:
+      print(f"cascade model load: {ollama_client.warm(CASCADE_MODEL, WARM_OPTIONS):.1f}s")
+
+  try:
+    if WORKERS <= 1:
+      _score_serially(pending, log_dir, store, results)
+    else:
+      _score_in_pool(pending, log_dir, store, results)
+  finally:
+    report_timings(results, time.perf_counter() - start)
+    if pending:
+      for model in filter(None, [CASCADE_MODEL, MODEL]):
+        try:
+          ollama_client.unload(model)
+        except requests.RequestException as e:
+          print(f"could not unload {model}: {e}")
+    if TRACE_PATH:
+      tracing.write(TRACE_PATH)
+
+if __name__ == "__main__":
+  main()
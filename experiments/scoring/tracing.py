@@ -0,0 +1,82 @@
+import json, math, os, threading, time
+from contextlib import contextmanager
+
+# complete ("X") events in the chrome trace event format, loadable in perfetto or chrome://tracing
+_events = []
+_lock = threading.Lock()
+
+@contextmanager
+def span(name, **args):
+  """
+  record the time spent in the block as a `name` span
+  """
+  start = time.time_ns()
+  try:
+    yield
+  finally:
+    event = {
+      "name": name,
+      "cat": "j2k",
+      "ph": "X",
+      # wall clock microseconds, so spans from pool processes line up with the driver's
+      "ts": start / 1000,
+      "dur": (time.time_ns() - start) / 1000,
+      "pid": os.getpid(),
+      "tid": threading.get_ident(),
+      "args": args,
+    }
+    with _lock:
+      _events.append(event)
+
+def drain() -> list[dict]:
+  """
+  return and forget every event recorded so far in this process
+  """
+  global _events
+  with _lock:
+    events, _events = _events, []
+  return events
+
+def extend(events):
+  with _lock:
+    _events.extend(events)
+
+def _percentile(values, q):
+  ordered = sorted(values)
+  return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+def summarise(events) -> dict[str, dict]:
+  """
+  return count, p50, p95 and max duration in seconds per span name
+  """
+  durations = {}
+  for event in events:
+    durations.setdefault(event["name"], []).append(event["dur"] / 1e6)
+
+  return {
+    name: {
+      "count": len(values),
+      "p50": _percentile(values, 0.5),
+      "p95": _percentile(values, 0.95),
+      "max": max(values),
+      "total": sum(values),
+    }
+    for name, values in durations.items()
+  }
+
+def write(path):
+  """
+  write every recorded event to `path` as a chrome trace, and print a per-stage summary
+  """
+  events = drain()
+  with open(path, "w") as f:
+    json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+  stages = summarise(events)
+  if not stages:
+    return
+
+  width = max(len(name) for name in stages)
+  print(f"{'stage':<{width}}  {'count':>5}  {'p50':>8}  {'p95':>8}  {'max':>8}  {'total':>9}")
+  for name, stage in sorted(stages.items(), key=lambda item: -item[1]["total"]):
+    print(f"{name:<{width}}  {stage['count']:>5}  {stage['p50']:>7.2f}s  {stage['p95']:>7.2f}s  {stage['max']:>7.2f}s  {stage['total']:>8.1f}s")
@@ -1,4 +1,5 @@
-import requests
+import ollama_client
+import tracing
 import json
 
 config = None
@@ -17,9 +18,7 @@ def _get_after_sentinel(kotlin_code: str):
   
   return kotlin_code[index + len(sentinel):].lstrip()
 
-def convert(java_code):
-  OLLAMA_URL = "http://localhost:11434/api/chat"
-
+def convert(java_code, model=MODEL):
   messages = [
     {
         "role": "system",
@@ -32,7 +31,7 @@ After <<START_J2K>>, output *only valid Kotlin source code*; do not add any labe
   ]
 
   payload = {
-    "model": MODEL,
+    "model": model,
     "messages": messages,
     "options": {
         "temperature": 0,
@@ -41,9 +40,9 @@ After <<START_J2K>>, output *only valid Kotlin source code*; do not add any labe
     "stream": False
   }
 
-  resp = requests.post(OLLAMA_URL, json=payload, timeout=600)
-  resp.raise_for_status()
-  data = resp.json()
+  # the reply is the kotlin, roughly as long as the java
+  data = ollama_client.chat(payload, output_tokens=ollama_client.estimate_tokens(java_code) * 2 + ollama_client.REASONING_TOKENS)
 
   output = data["message"]["content"]
-  return _get_after_sentinel(output)
+  with tracing.span("parse response"):
+    return _get_after_sentinel(output)
@@ -1,4 +1,6 @@
-import requests
+import re
+import ollama_client
+import tracing
 import json
 
 config = None
@@ -485,9 +487,7 @@ def _get_last_kotlin_text(string):
 
   return matches[-1].group(1).strip()
 
-def convert(java_code):
-  OLLAMA_URL = "http://localhost:11434/api/chat"
-
+def convert(java_code, model=MODEL):
   messages = [
     {
         "role": "system",
@@ -502,7 +502,7 @@ def convert(java_code):
   ]
 
   payload = {
-    "model": MODEL,
+    "model": model,
     "messages": messages,
     "options": {
         "temperature": 0,
@@ -511,9 +511,14 @@ def convert(java_code):
     "stream": False
   }
 
-  resp = requests.post(OLLAMA_URL, json=payload, timeout=600)
-  resp.raise_for_status()
-  data = resp.json()
+  # streaming stops at the first </kotlin> after </convert_think>, and the reply is sized for a copy of the
+  # file after each of the four thinking steps and in the final answer, plus one copy's worth of headroom
+  data = ollama_client.chat(
+    payload,
+    until=ollama_client.TagStream("</kotlin>", after="</convert_think>"),
+    output_tokens=ollama_client.estimate_tokens(java_code) * 6 + ollama_client.REASONING_TOKENS
+  )
 
   output = data["message"]["content"]
-  return _get_last_kotlin_text(output)
+  with tracing.span("parse response"):
+    return _get_last_kotlin_text(output)
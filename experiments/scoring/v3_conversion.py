@@ -1,7 +1,10 @@
 import re
+import asyncio
 from tree_sitter_languages import get_parser
-import requests
+import ollama_client
+import tracing
 import json
+from conversion_cache import ConversionCache, cache_key
 
 config = None
 
@@ -9,8 +12,24 @@ with open("config.json", "r") as f:
   config = json.loads(f.read())
 
 MODEL = config["model"]
+# per-function requests in flight at once; the server needs OLLAMA_NUM_PARALLEL for them to run in parallel
+FUNCTION_CONCURRENCY = config.get("function_concurrency", 4)
+# convert trivial accessors, delegating constructors and empty methods by rule instead of asking the model
+RULE_BASED_FUNCTIONS = config.get("rule_based_functions", False)
+
+# what each per-function prompt shows of the file: "file" for all of it, "slice" for only what the function
+# needs (see `slice_contexts`)
+FUNCTION_CONTEXT = config.get("function_context", "file")
+
+# per-function conversions, reused for structurally identical functions in any file or run
+FUNCTION_MEMO = None
+if config.get("function_memo"):
+  FUNCTION_MEMO = ConversionCache(config["function_memo"], config.get("function_memo_max_mb", 64) * 1024 * 1024)
+# also treat functions as identical when they only differ in the names of their parameters and locals
+FUNCTION_MEMO_RENAME = config.get("function_memo_rename", False)
 
 PARSER = get_parser("java")
+KOTLIN_PARSER = get_parser("kotlin")
 TYPE_NODES = {"class_declaration","interface_declaration","enum_declaration","record_declaration"}
 
 def _txt(src: bytes, node) -> str:
@@ -50,10 +69,9 @@ def _param_types(node, src: bytes) -> list[str]:
     out.append(ty)
   return out
 
-def list_function_addresses(java_src: str) -> list[str]:
-  src = java_src.encode("utf-8", errors="ignore")
+def _function_nodes(src: bytes) -> list[tuple[str, object]]:
   root = PARSER.parse(src).root_node
-  addrs: list[str] = []
+  functions = []
 
   stack = [root]
   while stack:
@@ -63,10 +81,366 @@ def list_function_addresses(java_src: str) -> list[str]:
       name_node = n.child_by_field_name("name")
       name = _txt(src, name_node) if n.type == "method_declaration" else "<init>"
       params = _param_types(n, src)
-      addrs.append(f"{cls}#{name}({','.join(params)})")
+      functions.append((f"{cls}#{name}({','.join(params)})", n))
     stack.extend(n.children)
 
-  return addrs
+  return functions
+
+def list_function_addresses(java_src: str) -> list[str]:
+  src = java_src.encode("utf-8", errors="ignore")
+  return [address for address, _ in _function_nodes(src)]
+
+PRIMITIVES = {
+  "int": "Int", "long": "Long", "short": "Short", "byte": "Byte",
+  "char": "Char", "boolean": "Boolean", "float": "Float", "double": "Double",
+}
+BOXED = {
+  "Integer": "Int", "Long": "Long", "Short": "Short", "Byte": "Byte", "Character": "Char",
+  "Boolean": "Boolean", "Float": "Float", "Double": "Double", "Object": "Any", "String": "String",
+}
+SIMPLE_ARGUMENTS = {"identifier", "this", "true", "false", "null_literal", "character_literal", "string_literal"}
+
+def _kotlin_type(src: bytes, node):
+  """
+  the kotlin type for a primitive, primitive array or plain class type, nullable where java's would be;
+  None for anything that takes more than a lookup (generics, wildcards, object arrays)
+  """
+  java_type = _txt(src, node)
+  if java_type in PRIMITIVES:
+    return PRIMITIVES[java_type]
+  if java_type.endswith("[]") and java_type[:-2] in PRIMITIVES:
+    return f"{PRIMITIVES[java_type[:-2]]}Array?"
+  if node.type == "type_identifier":
+    return f"{BOXED.get(java_type, java_type)}?"
+  return None
+
+def _modifiers(src: bytes, node):
+  """
+  the kotlin modifiers for a method or constructor, or None when it has modifiers a rule can't carry over
+  """
+  modifiers = next((c for c in node.children if c.type == "modifiers"), None)
+  words, override = [], False
+  for child in modifiers.children if modifiers else []:
+    text = _txt(src, child)
+    if child.type in ("marker_annotation", "annotation"):
+      if text != "@Override":
+        return None
+      override = True
+    elif text in ("public", "protected", "private", "final"):
+      words.append(text)
+    else:
+      return None
+
+  visibility = "" if "public" in words else "protected " if "protected" in words else "private " if "private" in words else "internal "
+  return visibility + ("override " if override else "")
+
+def _parameters(src: bytes, node):
+  params = []
+  for p in node.child_by_field_name("parameters").named_children:
+    kotlin_type = _kotlin_type(src, p.child_by_field_name("type")) if p.type == "formal_parameter" else None
+    if kotlin_type is None or any(c.type == "modifiers" for c in p.children):
+      return None
+    params.append((_txt(src, p.child_by_field_name("name")), kotlin_type))
+  return params
+
+def _field_name(src: bytes, node):
+  """
+  the field named by `x` or `this.x`, or None
+  """
+  if node.type == "identifier":
+    return _txt(src, node)
+  if node.type == "field_access" and node.child_by_field_name("object").type == "this":
+    return _txt(src, node.child_by_field_name("field"))
+  return None
+
+def _convert_trivial(src: bytes, node):
+  """
+  convert a getter, setter, delegating or empty constructor, or empty method by rule; None for anything else
+  """
+  if node.child_by_field_name("type_parameters"):
+    return None
+
+  modifiers = _modifiers(src, node)
+  params = _parameters(src, node)
+  body = node.child_by_field_name("body")
+  if modifiers is None or params is None or body is None:
+    return None
+
+  statements = body.named_children
+  if any(s.type in ("line_comment", "block_comment") for s in statements):
+    return None
+  signature = ", ".join(f"{name}: {kotlin_type}" for name, kotlin_type in params)
+
+  if node.type == "constructor_declaration":
+    if not statements:
+      return f"{modifiers}constructor({signature})"
+
+    if len(statements) == 1 and statements[0].type == "explicit_constructor_invocation":
+      invocation = statements[0]
+      target = invocation.child_by_field_name("constructor")
+      arguments = invocation.child_by_field_name("arguments").named_children
+      # string templates make `$` special in kotlin, so only plain strings are copied over
+      if target.type in ("this", "super") and all(a.type in SIMPLE_ARGUMENTS or a.type.endswith("integer_literal") or a.type.endswith("floating_point_literal") for a in arguments) \
+          and not any("$" in _txt(src, a) for a in arguments):
+        return f"{modifiers}constructor({signature}) : {target.type}({', '.join(_txt(src, a) for a in arguments)})"
+    return None
+
+  name = _txt(src, node.child_by_field_name("name"))
+  returns_void = node.child_by_field_name("type").type == "void_type"
+
+  if not statements and returns_void:
+    return f"{modifiers}fun {name}({signature}) {{\n}}"
+
+  if len(statements) != 1:
+    return None
+  statement = statements[0]
+
+  # getter: `return x;` or `return this.x;`
+  if not params and not returns_void and statement.type == "return_statement" and statement.named_children:
+    field = _field_name(src, statement.named_children[0])
+    return_type = _kotlin_type(src, node.child_by_field_name("type"))
+    if field and return_type:
+      return f"{modifiers}fun {name}(): {return_type} {{\n    return {field}\n}}"
+
+  # setter: `x = value;` or `this.x = value;`
+  if len(params) == 1 and returns_void and statement.type == "expression_statement":
+    assignment = statement.named_children[0]
+    if assignment.type == "assignment_expression" and _txt(src, assignment.child_by_field_name("operator")) == "=":
+      field = _field_name(src, assignment.child_by_field_name("left"))
+      value = assignment.child_by_field_name("right")
+      if field and value.type == "identifier" and _txt(src, value) == params[0][0]:
+        # a parameter shadowing the field needs `this.` in kotlin as in java
+        target = f"this.{field}" if field == params[0][0] else field
+        return f"{modifiers}fun {name}({signature}) {{\n    {target} = {params[0][0]}\n}}"
+
+  return None
+
+COMMENTS = {"line_comment", "block_comment"}
+
+def _indented(src: bytes, node, text=None) -> str:
+  """
+  `text` (the node's own by default) with the whitespace the node's line starts with
+  """
+  prefix = src[src.rfind(b"\n", 0, node.start_byte) + 1:node.start_byte]
+  indent = prefix.decode("utf-8", errors="ignore") if not prefix.strip() else ""
+  return indent + (_txt(src, node) if text is None else text)
+
+def _signature(src: bytes, node) -> str:
+  body = node.child_by_field_name("body")
+  return src[node.start_byte:body.start_byte].decode("utf-8", errors="ignore").rstrip() + " { ... }" if body else _txt(src, node)
+
+def _called_names(src: bytes, node) -> set[str]:
+  """
+  the methods `node` calls on its own class (`f()` or `this.f()`), plus "<init>" when it delegates to `this(...)`
+  """
+  names, stack = set(), [node]
+  while stack:
+    n = stack.pop()
+    if n.type == "method_invocation":
+      target = n.child_by_field_name("object")
+      if target is None or target.type == "this":
+        names.add(_txt(src, n.child_by_field_name("name")))
+    elif n.type == "explicit_constructor_invocation" and n.child_by_field_name("constructor").type == "this":
+      names.add("<init>")
+    stack.extend(n.children)
+  return names
+
+def _slice(src: bytes, root, node) -> str:
+  """
+  the java a model needs to convert `node` on its own: the package and imports, the header and fields of
+  every enclosing type, the signatures of the sibling methods it calls, and the function itself
+  """
+  lines = []
+  for n in root.named_children:
+    if n.type == "package_declaration":
+      lines += [_txt(src, n), ""]
+    elif n.type == "import_declaration":
+      lines.append(_txt(src, n))
+
+  types, cur = [], node.parent
+  while cur:
+    if cur.type in TYPE_NODES:
+      types.append(cur)
+    cur = cur.parent
+  types.reverse()
+
+  called = _called_names(src, node)
+  for depth, type_node in enumerate(types):
+    body = type_node.child_by_field_name("body")
+    lines.append("")
+    lines.append(_indented(src, type_node, src[type_node.start_byte:body.start_byte].decode("utf-8", errors="ignore").rstrip() + " {"))
+
+    for member in body.named_children:
+      if member.type in ("field_declaration", "constant_declaration", "enum_constant"):
+        lines.append(_indented(src, member))
+      elif member.type in ("method_declaration", "constructor_declaration") and member.start_byte != node.start_byte:
+        name = "<init>" if member.type == "constructor_declaration" else _txt(src, member.child_by_field_name("name"))
+        if name in called and depth == len(types) - 1:
+          lines.append(_indented(src, member, _signature(src, member)))
+
+    if depth == len(types) - 1:
+      # the function keeps its javadoc, which is as much a part of it as its body
+      previous = node.prev_named_sibling
+      lines.append("")
+      if previous is not None and previous.type in COMMENTS:
+        lines.append(_indented(src, previous))
+      lines.append(_indented(src, node))
+
+  for type_node in reversed(types):
+    lines.append(_indented(src, type_node, "}"))
+
+  return "\n".join(lines)
+
+def slice_contexts(java_src: str) -> dict[str, str]:
+  """
+  return the sliced context of every function, by address
+  """
+  src = java_src.encode("utf-8", errors="ignore")
+  root = PARSER.parse(src).root_node
+  return {address: _slice(src, root, node) for address, node in _function_nodes(src)}
+
+def _bound_names(src: bytes, node) -> set[str]:
+  """
+  the parameters and local variables declared anywhere in `node`
+  """
+  names, stack = set(), [node]
+  while stack:
+    n = stack.pop()
+    if n.type in ("formal_parameter", "catch_formal_parameter", "enhanced_for_statement"):
+      name = n.child_by_field_name("name")
+      if name:
+        names.add(_txt(src, name))
+    elif n.type == "variable_declarator" and n.parent.type in ("local_variable_declaration", "spread_parameter", "resource"):
+      names.add(_txt(src, n.child_by_field_name("name")))
+    elif n.type == "lambda_expression":
+      params = n.child_by_field_name("parameters")
+      if params.type == "identifier":
+        names.add(_txt(src, params))
+      else:
+        names.update(_txt(src, p) for p in params.named_children if p.type == "identifier")
+    stack.extend(n.children)
+  return names
+
+def _normalise(src: bytes, node, rename=False):
+  """
+  the function's tokens with comments and whitespace dropped, and the bound names renamed to `v0`, `v1`...
+  in order of appearance when `rename` is set. returns the text and the original names in that order
+  """
+  bound = _bound_names(src, node) if rename else set()
+  tokens, names = [], []
+
+  stack = [node]
+  while stack:
+    n = stack.pop()
+    if n.type in COMMENTS:
+      continue
+    if n.child_count:
+      stack.extend(reversed(n.children))
+      continue
+
+    text = _txt(src, n)
+    # `this.x` and `x()` name members, not the locals they may share a name with
+    member = n.parent.child_by_field_name({"field_access": "field", "method_invocation": "name"}.get(n.parent.type, "-"))
+    member = member is not None and member.start_byte == n.start_byte
+    if n.type == "identifier" and text in bound and not member:
+      if text not in names:
+        names.append(text)
+      text = f"v{names.index(text)}"
+    tokens.append(text)
+
+  return " ".join(tokens), names
+
+def _kotlin_names(kotlin: bytes):
+  """
+  the identifiers in `kotlin` that name something in scope, as nodes: not members after a `.`, not named
+  arguments, and nothing inside a string's text or a comment
+  """
+  nodes, stack = [], [KOTLIN_PARSER.parse(kotlin).root_node]
+  while stack:
+    n = stack.pop()
+    if n.type == "simple_identifier":
+      named_argument = n.parent.type == "value_argument" and n.next_sibling is not None and n.next_sibling.type == "="
+      if n.parent.type != "navigation_suffix" and not named_argument:
+        nodes.append(n)
+    elif n.type == "interpolated_identifier":
+      nodes.append(n)
+    else:
+      stack.extend(n.children)
+  return nodes
+
+def _rename(kotlin, old_names, new_names):
+  """
+  carry a memoised conversion over to a function that differs only in its bound names; None when a new
+  name already means something else in the kotlin, or when the kotlin does not parse
+  """
+  mapping = dict(zip(old_names, new_names))
+  src = kotlin.encode("utf-8")
+  if KOTLIN_PARSER.parse(src).root_node.has_error:
+    return None
+
+  nodes = _kotlin_names(src)
+  used = {_txt(src, n) for n in nodes}
+  if any(new in used for new in new_names if new not in mapping):
+    return None
+
+  # renamed back to front, so the byte offsets of the nodes still to go stay valid
+  for n in sorted(nodes, key=lambda n: n.start_byte, reverse=True):
+    name = _txt(src, n)
+    if name in mapping:
+      src = src[:n.start_byte] + mapping[name].encode("utf-8") + src[n.end_byte:]
+  return src.decode("utf-8")
+
+def _memo_key(normalised, model):
+  # a function converted with its sliced context is not interchangeable with one converted with the whole file
+  return cache_key("v3 function", model, FUNCTION_CONTEXT, normalised)
+
+def recall_functions(java_src: str, addresses, model=MODEL) -> dict[str, str]:
+  """
+  return the memoised kotlin, by address, of every function in `addresses` that has been converted before
+  """
+  src = java_src.encode("utf-8", errors="ignore")
+  recalled = {}
+
+  for address, node in _function_nodes(src):
+    if address not in addresses or address in recalled:
+      continue
+
+    normalised, names = _normalise(src, node, FUNCTION_MEMO_RENAME)
+    cached = FUNCTION_MEMO.get(_memo_key(normalised, model))
+    kotlin = None
+    if cached is not None:
+      entry = json.loads(cached)
+      kotlin = _rename(entry["kotlin"], entry["names"], names) if entry["names"] != names else entry["kotlin"]
+
+    if kotlin is None:
+      ollama_client.count("function_memo_misses")
+    else:
+      ollama_client.count("function_memo_hits")
+      recalled[address] = kotlin
+
+  return recalled
+
+def memoise_functions(java_src: str, converted, model=MODEL):
+  """
+  remember the model's kotlin for each function in `converted` (address -> kotlin)
+  """
+  src = java_src.encode("utf-8", errors="ignore")
+  for address, node in _function_nodes(src):
+    if address in converted:
+      normalised, names = _normalise(src, node, FUNCTION_MEMO_RENAME)
+      FUNCTION_MEMO.put(_memo_key(normalised, model), json.dumps({"kotlin": converted[address], "names": names}))
+
+def convert_trivial_functions(java_src: str) -> dict[str, str]:
+  """
+  return kotlin, by address, for every function simple enough to convert without the model
+  """
+  src = java_src.encode("utf-8", errors="ignore")
+  converted = {}
+  for address, node in _function_nodes(src):
+    kotlin = _convert_trivial(src, node)
+    if kotlin is not None:
+      converted[address] = kotlin
+  return converted
 
 TASK_CONTEXT = """You are a senior Kotlin engineer and Java-Kotlin JVM interop specialist."""
 
@@ -222,43 +596,60 @@ def _get_last_kotlin_text(string):
 
   return matches[-1].group(1).strip()
 
-def convert(java_code):
-  OLLAMA_URL = "http://localhost:11434/api/chat"
-
-  function_results = []
-
-  for address in list_function_addresses(java_code):
-    messages = [
-      {
-          "role": "system",
-          "content": (
-              "You are a senior Kotlin engineer and Java-Kotlin JVM interop specialist. "
-              "Convert the given function to idiomatic Kotlin and output the final code in <kotlin> tags. "
-              "Preserve behavior and API, prefer idiomatic Kotlin when safe."
-          )
-      },
-      { "role": "user", "content": _get_function_prompt(java_code, address) },
-    ]
-
-    payload = {
-      "model": MODEL,
-      "messages": messages,
-      "keep_alive": 0,
-      "options": {
-          "temperature": 0,
-          "num_ctx": 8192 * 2,
-      },
-      "stream": False
-    }
-
-    resp = requests.post(OLLAMA_URL, json=payload, timeout=600)
-    resp.raise_for_status()
-    data = resp.json()
-
-    output = data["message"]["content"]
-    function_results.append((address, _get_last_kotlin_text(output)))
-
+def _convert_function(java_code, address, model=MODEL):
+  """
+  convert one function, with `java_code` (the whole file or its slice for this function) as context
+  """
   messages = [
+    {
+        "role": "system",
+        "content": (
+            "You are a senior Kotlin engineer and Java-Kotlin JVM interop specialist. "
+            "Convert the given function to idiomatic Kotlin and output the final code in <kotlin> tags. "
+            "Preserve behavior and API, prefer idiomatic Kotlin when safe."
+        )
+    },
+    { "role": "user", "content": _get_function_prompt(java_code, address) },
+  ]
+
+  payload = {
+    "model": model,
+    "messages": messages,
+    "options": {
+        "temperature": 0,
+        "num_ctx": 8192 * 2,
+    },
+    "stream": False
+  }
+
+  # a function prompt asks for exactly one <kotlin> block, which is never longer than the whole file
+  data = ollama_client.chat(
+    payload,
+    until=ollama_client.TagStream("</kotlin>"),
+    output_tokens=ollama_client.estimate_tokens(java_code) * 2 + ollama_client.REASONING_TOKENS
+  )
+
+  output = data["message"]["content"]
+  with tracing.span("parse response"):
+    return (address, _get_last_kotlin_text(output))
+
+async def _convert_functions(java_code, addresses, model=MODEL):
+  """
+  convert every function concurrently, at most `FUNCTION_CONCURRENCY` requests at a time, returning the
+  results in address order
+  """
+  semaphore = asyncio.Semaphore(FUNCTION_CONCURRENCY)
+  contexts = slice_contexts(java_code) if FUNCTION_CONTEXT == "slice" else {}
+
+  async def convert_one(address):
+    async with semaphore:
+      # requests are blocking, so each runs on a worker thread while the event loop schedules the rest
+      return await asyncio.to_thread(_convert_function, contexts.get(address, java_code), address, model)
+
+  return await asyncio.gather(*(convert_one(address) for address in addresses))
+
+def _main_messages(java_code, function_results):
+  return [
     {
         "role": "system",
         "content": (
@@ -270,10 +661,35 @@ def convert(java_code):
     { "role": "user", "content": _get_main_prompt(java_code, function_results) },
   ]
 
+def convert(java_code, model=MODEL):
+  addresses = list_function_addresses(java_code)
+  known = convert_trivial_functions(java_code) if RULE_BASED_FUNCTIONS else {}
+  if FUNCTION_MEMO:
+    known.update(recall_functions(java_code, [a for a in addresses if a not in known], model))
+  ollama_client.count("skipped_requests", len(known))
+
+  converted = dict(asyncio.run(_convert_functions(java_code, [a for a in addresses if a not in known], model)))
+  if FUNCTION_MEMO:
+    memoise_functions(java_code, converted, model)
+
+  function_results = [(address, known[address] if address in known else converted[address]) for address in addresses]
+  output_tokens = ollama_client.estimate_tokens(java_code) * 2 + ollama_client.REASONING_TOKENS
+
+  # the main prompt repeats every converted function, so a large class can outgrow the largest context;
+  # the longest conversions are left out until it fits, and the model converts those functions itself
+  if ollama_client.AUTO_NUM_CTX:
+    kept = list(function_results)
+    while kept and ollama_client.context_size(_main_messages(java_code, kept), output_tokens) is None:
+      longest = max(kept, key=lambda f: len(f[1]))
+      kept = [f for f in kept if f is not longest]
+
+    if len(kept) < len(function_results):
+      print(f"left {len(function_results) - len(kept)} of {len(function_results)} function conversions out of the main prompt to fit the context")
+    function_results = kept
+
   payload = {
-    "model": MODEL,
-    "messages": messages,
-    "keep_alive": 0,
+    "model": model,
+    "messages": _main_messages(java_code, function_results),
     "options": {
         "temperature": 0,
         "num_ctx": 8192 * 2,
@@ -281,9 +697,8 @@ def convert(java_code):
     "stream": False
   }
 
-  resp = requests.post(OLLAMA_URL, json=payload, timeout=600)
-  resp.raise_for_status()
-  data = resp.json()
+  data = ollama_client.chat(payload, output_tokens=output_tokens)
 
   output = data["message"]["content"]
-  return _get_last_kotlin_text(output)
+  with tracing.span("parse response"):
+    return _get_last_kotlin_text(output)
@@ -0,0 +1,142 @@
+import sys, pathlib, json, os
+import ollama_client
+import tracing
+
+from v2_conversion import (
+  TASK_CONTEXT, TASK_DESCRIPTION, EXAMPLES, INVARIANTS, PRECOGNITION, OUTPUT_FORMATTING, REMARKS, PREFILL,
+  _get_prompt as _get_v2_prompt, _get_last_kotlin_text
+)
+
+config = None
+
+with open("config.json", "r") as f:
+  config = json.loads(f.read())
+
+MODEL = config["model"]
+
+SYSTEM = (
+  "You are a senior Kotlin engineer and Java-Kotlin JVM interop specialist. "
+  "Follow the four-step conversion (<convert_think>) and output final code in <kotlin> tags. "
+  "Preserve behavior and API, prefer idiomatic Kotlin when safe."
+)
+
+def _get_static_prefix():
+  """
+  every section of the v2 prompt that is the same for all files, in v2's order, ending with the lead-in to
+  the java input. nothing after it changes between files, so ollama's prompt cache can reuse all of it
+  """
+  PROMPT = ""
+
+  if TASK_CONTEXT:
+    PROMPT += f"""{TASK_CONTEXT}"""
+
+  if TASK_DESCRIPTION:
+    PROMPT += f"""\n\n{TASK_DESCRIPTION}"""
+
+  if EXAMPLES:
+    PROMPT += f"""\n\n{EXAMPLES}"""
+
+  if INVARIANTS:
+    PROMPT += f"""\n\n{INVARIANTS}"""
+
+  if PRECOGNITION:
+    PROMPT += f"""\n\n{PRECOGNITION}"""
+
+  if OUTPUT_FORMATTING:
+    PROMPT += f"""\n\n{OUTPUT_FORMATTING}"""
+
+  if REMARKS:
+    PROMPT += f"""\n\n{REMARKS}"""
+
+  PROMPT += """\n\nThe Java code to convert is:\n<java>\n"""
+
+  return PROMPT
+
+STATIC_PREFIX = _get_static_prefix()
+
+def _get_prompt(java_code):
+  return f"""{STATIC_PREFIX}{java_code}\n</java>"""
+
+def _messages(prompt):
+  return [
+    { "role": "system", "content": SYSTEM },
+    { "role": "user", "content": prompt },
+    { "role": "assistant", "content": PREFILL }
+  ]
+
+def convert(java_code, model=MODEL):
+  payload = {
+    "model": model,
+    "messages": _messages(_get_prompt(java_code)),
+    "options": {
+        "temperature": 0,
+        "num_ctx": 8192 * 2,
+    },
+    "stream": False
+  }
+
+  data = ollama_client.chat(
+    payload,
+    until=ollama_client.TagStream("</kotlin>", after="</convert_think>"),
+    output_tokens=ollama_client.estimate_tokens(java_code) * 6 + ollama_client.REASONING_TOKENS
+  )
+
+  output = data["message"]["content"]
+  with tracing.span("parse response"):
+    return _get_last_kotlin_text(output)
+
+def shared_prefix(java_codes, get_prompt=_get_prompt) -> int:
+  """
+  return the number of leading characters that every file's prompt has in common
+  """
+  prompts = [get_prompt(java_code) for java_code in java_codes]
+  return len(os.path.commonprefix(prompts)) if prompts else 0
+
+def _prompt_eval(prompt) -> dict:
+  # a single generated token is enough: only the prompt evaluation is being measured
+  payload = {
+    "model": MODEL,
+    "messages": _messages(prompt),
+    "options": {
+        "temperature": 0,
+        "num_ctx": 8192 * 2,
+        "num_predict": 1,
+    },
+    "stream": False
+  }
+
+  resp = ollama_client.session().post(ollama_client.OLLAMA_URL, json=payload, timeout=ollama_client.HTTP["read_timeout"])
+  resp.raise_for_status()
+  return resp.json()
+
+def compare(paths):
+  """
+  check that the v7 prefix is byte-identical across `paths`, then send each file's v2 and v7 prompts
+  back to back and compare the prompt tokens ollama actually evaluated
+  """
+  java_codes = [pathlib.Path(path).read_text() for path in paths]
+
+  shared = shared_prefix(java_codes)
+  if len(java_codes) > 1 and shared < len(STATIC_PREFIX):
+    raise Exception(f"v7 prompts only share {shared} of {len(STATIC_PREFIX)} static prefix characters")
+
+  print(f"shared prompt prefix: v2 {shared_prefix(java_codes, _get_v2_prompt)} chars, v7 {shared} chars")
+
+  ollama_client.warm(MODEL, {"num_ctx": 8192 * 2})
+  try:
+    for version, get_prompt in [("v2", _get_v2_prompt), ("v7", _get_prompt)]:
+      # the first request of each layout fills the cache; the rest show what reusing it saves
+      tokens, seconds = 0, 0.0
+      for java_code in java_codes:
+        data = _prompt_eval(get_prompt(java_code))
+        tokens += data.get("prompt_eval_count", 0)
+        seconds += data.get("prompt_eval_duration", 0) / 1e9
+
+      print(f"{version}: {tokens} prompt tokens evaluated in {seconds:.1f}s over {len(java_codes)} files")
+  finally:
+    ollama_client.unload(MODEL)
+
+if __name__ == "__main__":
+  compare(sys.argv[1:] or sorted(
+    str(path) for path in pathlib.Path("src/main").rglob("*.java") if "test" not in str(path).lower()
+  ))
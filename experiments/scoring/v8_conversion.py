@@ -0,0 +1,133 @@
+import re
+import ollama_client
+import tracing
+import json
+
+import v2_conversion
+from v7_conversion import SYSTEM
+from v2_conversion import TASK_CONTEXT, TASK_DESCRIPTION, OUTPUT_FORMATTING, REMARKS, PREFILL, _get_last_kotlin_text
+
+config = None
+
+with open("config.json", "r") as f:
+  config = json.loads(f.read())
+
+MODEL = config["model"]
+
+# short notes on what each v2 step changes, in place of the full kotlin v2 writes after every step
+EXAMPLE_NOTES = [
+  """1: DateGreeter is implicitly open, so it becomes `open class DateGreeter`. The static `greet` moves into a companion object.
+- `public class DateGreeter` -> `open class DateGreeter`
+- `public static void greet(String name)` -> `companion object { fun greet(name: String?) }`
+
+2: `name` is explicitly null-checked, so it is `String?`. `who` is only read, so it is a `val`.
+- `String who = ...` -> `val who = if (name != null) name else "Guest"`
+
+3: No collections, no change.
+
+4: `greet` uses no state of DateGreeter, so it becomes a top level function. The null check becomes an Elvis operator inside a string template.
+- companion object removed, `fun greet(name: String?)` is top level
+- `"Hello, " + who + ...` -> `"Hello, ${name ?: "Guest"} ... ${LocalDate.now()}"`
+
+Invariants: 1 OK, 2 OK (none present), 3 OK, 4 OK""",
+  """1: Package and imports carried forward. User is implicitly open, so it becomes `open class User`. Field annotations keep their target with `@field:`, and accessors stay explicit functions for now. `Objects.requireNonNull` stays.
+- `public class User` -> `open class User`
+- `@JsonProperty("id") private final String id` -> `@field:JsonProperty("id") private val id: String`
+- `@Nullable private String nickname` -> `@field:Nullable private var nickname: String? = null`
+
+2: `id` is non-null, enforced by the constructor; `nickname` is `@Nullable` throughout and stays `String?`. `id` is never reassigned and `nickname` is, matching `val` and `var`. No change.
+
+3: No collections, no change.
+
+4: Accessors become properties. `id` moves into the primary constructor as a `val` with both its field and getter annotations, which makes `requireNonNull` redundant. `nickname` becomes a `var` property keeping both `@Nullable` targets. `java.util.Objects` is kept, since imports are carried forward.
+- constructor, `getId()` -> `class User(@field:JsonProperty("id") @get:JsonProperty("id") val id: String)`
+- `getNickname()`, `setNickname()` -> `@field:Nullable @get:Nullable var nickname: String? = null`
+
+Invariants: 1 OK, 2 OK, 3 OK, 4 OK""",
+]
+
+def _get_examples():
+  """
+  v2's examples, with the per-step notes above in place of v2's per-step code and invariant checklists
+  """
+  EXAMPLES = """Some examples are given for you below."""
+
+  cases = re.findall(r"<example>\n<java>\n(.*?)\n</java>.*?</convert_think>\n\n<kotlin>\n(.*?)\n</kotlin>\n</example>", v2_conversion.EXAMPLES, re.DOTALL)
+  for (java, kotlin), notes in zip(cases, EXAMPLE_NOTES):
+    EXAMPLES += f"""\n\n<example>\n<java>\n{java}\n</java>\n\n<convert_think>\n{notes}\n</convert_think>\n\n<kotlin>\n{kotlin}\n</kotlin>\n</example>"""
+
+  return EXAMPLES
+
+EXAMPLES = _get_examples()
+
+PRECOGNITION = """Before emitting any code, run through the provided Java input and perform these 4 steps of thinking, wrapped in <convert_think> tags.
+Do not write out the code after each step. Instead, note in a few lines what the step changes, as a list of edits from the Java (or the previous step) to the Kotlin, or say that there is no change. Only write the Kotlin once, after </convert_think>, with every step applied.
+
+""" + v2_conversion.PRECOGNITION.split("\n\n", 1)[1]
+
+INVARIANTS = v2_conversion.INVARIANTS.rsplit("\n\n", 1)[0] + """
+
+After the last step, check each of these invariants once against the edits you noted. If any would no longer hold, revise the step that broke it before writing the Kotlin."""
+
+def _get_prompt(java_code):
+  PROMPT = ""
+
+  INPUT_DATA = f"""The Java code to convert is:
+<java>
+{java_code}
+</java>"""
+
+  if TASK_CONTEXT:
+    PROMPT += f"""{TASK_CONTEXT}"""
+
+  if TASK_DESCRIPTION:
+    PROMPT += f"""\n\n{TASK_DESCRIPTION}"""
+
+  if EXAMPLES:
+    PROMPT += f"""\n\n{EXAMPLES}"""
+
+  if INVARIANTS:
+    PROMPT += f"""\n\n{INVARIANTS}"""
+
+  if PRECOGNITION:
+    PROMPT += f"""\n\n{PRECOGNITION}"""
+
+  if OUTPUT_FORMATTING:
+    PROMPT += f"""\n\n{OUTPUT_FORMATTING}"""
+
+  if REMARKS:
+    PROMPT += f"""\n\n{REMARKS}"""
+
+  # the java input goes last, as in v7, so the static sections stay in ollama's prompt cache
+  if INPUT_DATA:
+    PROMPT += f"""\n\n{INPUT_DATA}"""
+
+  return PROMPT
+
+def convert(java_code, model=MODEL):
+  messages = [
+    { "role": "system", "content": SYSTEM },
+    { "role": "user", "content": _get_prompt(java_code) },
+    { "role": "assistant", "content": PREFILL }
+  ]
+
+  payload = {
+    "model": model,
+    "messages": messages,
+    "options": {
+        "temperature": 0,
+        "num_ctx": 8192 * 2,
+    },
+    "stream": False
+  }
+
+  # the notes are short, so the reply is about one copy of the file plus reasoning
+  data = ollama_client.chat(
+    payload,
+    until=ollama_client.TagStream("</kotlin>", after="</convert_think>"),
+    output_tokens=ollama_client.estimate_tokens(java_code) * 2 + ollama_client.REASONING_TOKENS
+  )
+
+  output = data["message"]["content"]
+  with tracing.span("parse response"):
+    return _get_last_kotlin_text(output)
@@ -0,0 +1,55 @@
+"""
+cheap checks on a converted file, run before paying for a build: the kotlin must parse, and the checks from
+`../dspy/metric.py` must pass. ported here because the harness is copied into the project on its own, and
+uses `tree_sitter_languages` rather than `tree_sitter_language_pack`.
+"""
+import re
+from tree_sitter_languages import get_parser
+
+PARSER = get_parser("kotlin")
+
+JAVA_ONLY_FUNCS = ["equalsIgnoreCase"]
+
+IGNORED_IMPORTS = [
+  "java.util.List", "java.util.Set", "java.util.Map",
+  "java.util.ArrayList", "java.util.HashSet", "java.util.HashMap"
+]
+
+OPEN_CLASS_RE = re.compile(r'\bopen\s+class\s+[A-Z]\w*')
+JAVA_CLASS_RE = re.compile(r'\b(?:(public|protected|private)\s+)?(?:(abstract|final)\s+)?class\s+([A-Z]\w*)')
+
+JAVA_MUT_COL_RE = re.compile(r'\b(java\.util\.)?(List|Set|Map)<')
+KT_MUT_COL_RE = re.compile(r'\bMutable(List|Set|Map)<')
+KT_MUT_CONSTRUCTOR_RE = re.compile(r'\bmutable(List|Set|Map)Of\s*\(')
+
+def _imports(code) -> list[str]:
+  return [l.strip() for l in code.splitlines() if l.strip().startswith("import ")]
+
+def valid_kotlin_syntax(java_code, kotlin_code) -> bool:
+  return bool(kotlin_code.strip()) and not PARSER.parse(kotlin_code.encode("utf-8")).root_node.has_error
+
+def no_java_only_funcs(java_code, kotlin_code) -> bool:
+  return not any(f in kotlin_code for f in JAVA_ONLY_FUNCS)
+
+def no_lost_imports(java_code, kotlin_code) -> bool:
+  kotlin_imports = _imports(kotlin_code)
+  java_imports = [imp for imp in _imports(java_code) if not any(ignore in imp for ignore in IGNORED_IMPORTS)]
+
+  return len(java_imports) == len(kotlin_imports) and not any(imp.endswith(".*") for imp in kotlin_imports)
+
+def open_classes_match(java_code, kotlin_code) -> bool:
+  need_open = [m.group(3) for m in JAVA_CLASS_RE.finditer(java_code) if (m.group(2) or "") not in ("final", "abstract")]
+  return not need_open or len(OPEN_CLASS_RE.findall(kotlin_code)) == len(need_open)
+
+def mutability_match(java_code, kotlin_code) -> bool:
+  want_mut = len(JAVA_MUT_COL_RE.findall(java_code))
+  got_mut = len(KT_MUT_COL_RE.findall(kotlin_code)) + len(KT_MUT_CONSTRUCTOR_RE.findall(kotlin_code))
+  return want_mut == 0 or got_mut == want_mut
+
+CHECKS = [valid_kotlin_syntax, no_java_only_funcs, no_lost_imports, open_classes_match, mutability_match]
+
+def validate(java_code, kotlin_code) -> list[str]:
+  """
+  return the names of the checks `kotlin_code` fails as a conversion of `java_code`; empty when it passes
+  """
+  return [check.__name__ for check in CHECKS if not check(java_code, kotlin_code)]
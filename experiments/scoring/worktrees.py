@@ -0,0 +1,70 @@
+import fnmatch
+import os
+import pathlib
+import shutil
+import subprocess
+import tempfile
+
+# build outputs and scoring artefacts are never copied: every worker builds from scratch
+IGNORED = {"build", ".gradle", ".kotlin", "logs", "scores.txt"}
+# nor is the harness's own state, which lives in the project while it runs; the sqlite stores can be
+# hundreds of megabytes and are live WAL databases, so a copy of one would not even be consistent
+IGNORED_PATTERNS = [
+  "*.sqlite", "*.sqlite-wal", "*.sqlite-shm", "trace.json", "coverage_index.json",
+  "cassette*.jsonl.gz", "benchmark_results.jsonl", "prompt_benchmark",
+]
+
+def _ignored(name) -> bool:
+  return name in IGNORED or any(fnmatch.fnmatch(name, pattern) for pattern in IGNORED_PATTERNS)
+
+def _clone(src: pathlib.Path, dst: pathlib.Path):
+  """
+  copy `src` to `dst`, sharing blocks with the original where the filesystem supports it
+  """
+  for cmd in (["cp", "-a", "--reflink=auto"], ["cp", "-c", "-R"]):
+    try:
+      subprocess.run([*cmd, str(src), str(dst)], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+      return
+    except (OSError, subprocess.CalledProcessError):
+      continue
+
+  if src.is_dir():
+    shutil.copytree(src, dst, symlinks=True)
+  else:
+    shutil.copy2(src, dst)
+
+def create_worktrees(project=".", count=1, root=None) -> list[pathlib.Path]:
+  """
+  create `count` isolated copies of `project` under `root` (a fresh temporary directory by default)
+  """
+  project = pathlib.Path(project).resolve()
+  root = pathlib.Path(root or tempfile.mkdtemp(prefix="j2k-worktrees-"))
+
+  worktrees = []
+  for i in range(count):
+    worktree = root / f"worker-{i}"
+    worktree.mkdir(parents=True, exist_ok=True)
+
+    for entry in project.iterdir():
+      if _ignored(entry.name) or (worktree / entry.name).exists():
+        continue
+      _clone(entry, worktree / entry.name)
+
+    gradlew = worktree / "gradlew"
+    if gradlew.exists():
+      gradlew.chmod(gradlew.stat().st_mode | 0o111)
+
+    worktrees.append(worktree)
+
+  return worktrees
+
+def remove_worktrees(worktrees):
+  for worktree in worktrees:
+    shutil.rmtree(worktree, ignore_errors=True)
+
+  parents = {pathlib.Path(w).parent for w in worktrees}
+  for parent in parents:
+    try:
+      os.rmdir(parent)
+    except OSError:
+      pass